@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
 from mcdagua.config import load_config
+from mcdagua.core.json_rapido import ProvedorJSON
 from mcdagua.extensions import cache, scheduler, jwt
 from mcdagua.routes.ui import ui_bp
 from mcdagua.routes.api import api_bp
@@ -13,6 +14,7 @@ from mcdagua.tasks.refresh import scheduled_refresh
 def create_app():
     app = Flask(__name__)
     app.secret_key = "super-secure-key"
+    app.json = ProvedorJSON(app)  # jsonify com orjson
 
     load_config(app)
     
@@ -0,0 +1,91 @@
+"""
+Benchmark das engines de leitura de .xlsx nas abas que o sistema realmente lê.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.leitores_excel                 # planilhas de PATH_GERAL/VISA/HACCP
+    python -m benchmarks.leitores_excel -n 5 a.xlsx     # arquivo(s) específico(s)
+
+Para cada aba é medido o tempo de pd.read_excel com cada engine instalada
+(melhor e média de N repetições) e conferido se o DataFrame resultante é
+igual ao do openpyxl.
+"""
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+from dotenv import load_dotenv
+
+from mcdagua.core.leitor_excel import engines_disponiveis
+from mcdagua.core.workbook import encontrar_aba
+
+BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+FILES_DIR = os.path.join(BASE_DIR, "arquivos_sistema")
+
+# Abas lidas pelo sistema: (nome da aba, linha de cabeçalho)
+ABAS_CONHECIDAS = [
+    ("GERAL", 1),
+    ("Gráfico pendencia", None),
+    ("Consolidado Coletas", 0),
+    ("HACCP", 1),
+    ("GRÁFICO", None),
+]
+
+
+def planilhas_padrao():
+    load_dotenv()
+    return [
+        os.getenv("PATH_GERAL", os.path.join(FILES_DIR, "Planilha_Potabilidade.xlsx")),
+        os.getenv("PATH_VISA", os.path.join(FILES_DIR, "Planilha_VISA.xlsx")),
+        os.getenv("PATH_HACCP", os.path.join(FILES_DIR, "Planilha_HACCP.xlsx")),
+    ]
+
+
+def medir(path, aba, header, engine, repeticoes):
+    tempos = []
+    df = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df = pd.read_excel(path, sheet_name=aba, header=header, engine=engine)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), sum(tempos) / len(tempos), df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("planilhas", nargs="*", help="arquivos .xlsx (padrão: PATH_GERAL/VISA/HACCP)")
+    parser.add_argument("-n", "--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    # openpyxl primeiro: é a referência para conferir os resultados
+    engines = sorted(engines_disponiveis(), key=lambda e: e != "openpyxl")
+    print(f"Engines disponíveis: {', '.join(engines)}\n")
+
+    for path in args.planilhas or planilhas_padrao():
+        if not os.path.exists(path):
+            print(f"⚠️ {path}: arquivo não encontrado\n")
+            continue
+
+        print(f"📄 {os.path.basename(path)} ({os.path.getsize(path) / 1024:.0f} KB)")
+        abas = pd.ExcelFile(path).sheet_names
+
+        for nome, header in ABAS_CONHECIDAS:
+            aba = encontrar_aba(abas, nome)
+            if not aba:
+                continue
+
+            referencia = None
+            for engine in engines:
+                melhor, media, df = medir(path, aba, header, engine, args.repeticoes)
+                if referencia is None:
+                    referencia = df
+                igual = "✔" if df.equals(referencia) else "≠ openpyxl"
+                print(f"   {aba:<22} {df.shape[0]:>7}x{df.shape[1]:<4} {engine:<9} "
+                      f"melhor {melhor * 1000:8.1f} ms | média {media * 1000:8.1f} ms  {igual}")
+        print()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
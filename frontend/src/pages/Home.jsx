@@ -183,7 +183,19 @@ export default function Home() {
     const formData = new FormData();
     formData.append("file", file);
     try {
-      await api.post(`/upload/${uploadType}`, formData, { headers: { "Content-Type": "multipart/form-data" } });
+      const { data } = await api.post(`/upload/${uploadType}`, formData, { headers: { "Content-Type": "multipart/form-data" } });
+
+      // O backend processa a planilha em segundo plano: acompanha o job até terminar
+      let job = data;
+      while (job.job_id || job.id) {
+        const jobId = job.job_id || job.id;
+        if (job.status === "concluido") break;
+        if (job.status === "erro") throw { response: { data: { msg: job.erro || "Erro ao processar a planilha." } } };
+        setUploadMsg({ type: "success", text: `Processando ${uploadType.toUpperCase()}... ${job.progresso || 0}%` });
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await api.get(`/api/ingest-jobs/${jobId}`)).data;
+      }
+
       setUploadMsg({ type: "success", text: `Base ${uploadType.toUpperCase()} atualizada!` });
       setTimeout(() => setUploadMsg(null), 3000);
       refreshStatus(); 
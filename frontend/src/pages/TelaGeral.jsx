@@ -2,7 +2,7 @@ import React, { useEffect, useState, useRef, useMemo, useCallback } from "react"
 import { api } from "../api/api";
 import { 
   ArrowLeft, Filter, Table, X, RefreshCw, Check, ChevronDown, 
-  BarChart3, Settings2, GripVertical, Search, Siren, Download, 
+  BarChart3, Settings2, GripVertical, Search, Siren, Download, FileSpreadsheet, 
   ZoomIn, ZoomOut, Maximize2, Minimize2, Eye, EyeOff, Layers,
   ArrowUpAZ, ArrowDownZA, Hash 
 } from "lucide-react";
@@ -293,16 +293,21 @@ export default function TelaGeral() {
     init();
   }, [location.state]);
 
+  const montarParams = (filtros, mapNomes = nomesColunas) => {
+    const params = new URLSearchParams();
+    Object.entries(filtros).forEach(([key, val]) => {
+      const col = mapNomes[key] || key;
+      if (Array.isArray(val) && val.length > 0) params.append(col, val.join("|"));
+      else if (val) params.append(col, val);
+    });
+    return params;
+  };
+
   const fetchDados = async (filtros = {}, mapNomes = nomesColunas) => {
     setLoading(true);
     setVisibleRows(50);
     try {
-      const params = new URLSearchParams();
-      Object.entries(filtros).forEach(([key, val]) => {
-        const col = mapNomes[key] || key;
-        if (Array.isArray(val) && val.length > 0) params.append(col, val.join("|"));
-        else if (val) params.append(col, val);
-      });
+      const params = montarParams(filtros, mapNomes);
 
       const res = await api.get(`/api/geral?${params.toString()}`);
       setDados(res.data.dados || []);
@@ -437,6 +442,27 @@ export default function TelaGeral() {
     }
   };
 
+  // --- EXPORTA SÓ AS LINHAS FILTRADAS E AS COLUNAS VISÍVEIS (XLSX GERADO NO SERVIDOR) ---
+  const handleExportarFiltrados = async () => {
+    try {
+      const params = montarParams(filtrosAtivos);
+      if (colunasOcultas.length > 0) params.set("exclude", colunasOcultas.join(","));
+      params.set("format", "xlsx");
+      const response = await api.get(`/api/geral/export?${params.toString()}`, { responseType: "blob" });
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = document.createElement("a");
+      link.href = url;
+      link.setAttribute("download", "Potabilidade_Filtrado.xlsx");
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+    } catch (e) {
+      console.error("Export error:", e);
+      alert("Erro ao exportar os dados filtrados.");
+    }
+  };
+
   return (
     <div className={`h-screen flex flex-col bg-slate-950 text-white overflow-hidden transition-all duration-300`}>
       
@@ -518,6 +544,7 @@ export default function TelaGeral() {
                 <>
                   <div className="w-[1px] h-6 bg-slate-800 mx-1"></div>
                   <button onClick={handleDownloadExcel} className="p-2 bg-green-600 hover:bg-green-500 rounded-lg text-white shadow-lg"><Download size={18} /></button>
+                  <button onClick={handleExportarFiltrados} className="p-2 bg-emerald-700 hover:bg-emerald-600 rounded-lg text-white shadow-lg" title="Exportar Dados Filtrados (Excel)"><FileSpreadsheet size={18} /></button>
                   <button onClick={() => navigate("/graficos-novo")} className="p-2 bg-slate-800 hover:bg-slate-700 border border-slate-700 rounded-lg text-purple-400"><BarChart3 size={18}/></button>
                   <button onClick={() => fetchDados(filtrosAtivos)} className="p-2 bg-blue-600 hover:bg-blue-500 rounded-lg text-white shadow-lg"><RefreshCw size={18} /></button>
                 </>
@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useRef } from "react";
 import { api } from "../api/api";
-import { ArrowLeft, Filter, TestTube, X, RefreshCw, Check, ChevronDown, BarChart3, Download } from "lucide-react";
+import { ArrowLeft, Filter, TestTube, X, RefreshCw, Check, ChevronDown, BarChart3, Download, FileSpreadsheet } from "lucide-react";
 import { useNavigate } from "react-router-dom";
 
 // --- COMPONENTE MULTI-SELECT ---
@@ -91,18 +91,22 @@ export default function TelaVisa() {
   const [filtrosAtivos, setFiltrosAtivos] = useState({});
   const [loading, setLoading] = useState(true);
 
+  const montarParams = (filtros) => {
+    const params = new URLSearchParams();
+    Object.entries(filtros).forEach(([key, val]) => {
+      if (Array.isArray(val) && val.length > 0) {
+        params.append(key, val.join(","));
+      } else if (val && !Array.isArray(val)) {
+        params.append(key, val);
+      }
+    });
+    return params;
+  };
+
   const fetchDados = async (filtros = {}) => {
     setLoading(true);
     try {
-      const params = new URLSearchParams();
-      
-      Object.entries(filtros).forEach(([key, val]) => {
-        if (Array.isArray(val) && val.length > 0) {
-          params.append(key, val.join(","));
-        } else if (val && !Array.isArray(val)) {
-          params.append(key, val);
-        }
-      });
+      const params = montarParams(filtros);
 
       const res = await api.get(`/api/visa?${params.toString()}`);
       
@@ -159,6 +163,26 @@ export default function TelaVisa() {
     }
   };
 
+  // --- EXPORTA SÓ AS LINHAS FILTRADAS (XLSX GERADO NO SERVIDOR) ---
+  const handleExportarFiltrados = async () => {
+    try {
+      const params = montarParams(filtrosAtivos);
+      params.set("format", "xlsx");
+      const response = await api.get(`/api/visa/export?${params.toString()}`, { responseType: "blob" });
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = document.createElement("a");
+      link.href = url;
+      link.setAttribute("download", "VISA_Filtrado.xlsx");
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error("Erro ao exportar", error);
+      alert("Erro ao exportar os dados filtrados.");
+    }
+  };
+
   return (
     <div className="min-h-screen bg-slate-950 text-white p-4 md:p-8">
       
@@ -186,6 +210,14 @@ export default function TelaVisa() {
             <Download size={18} />
           </button>
 
+          <button 
+            onClick={handleExportarFiltrados} 
+            className="p-2 bg-emerald-700 hover:bg-emerald-600 rounded-lg transition text-white shadow-lg shadow-emerald-900/20"
+            title="Exportar Dados Filtrados (Excel)"
+          >
+            <FileSpreadsheet size={18} />
+          </button>
+
           <button 
             onClick={() => navigate("/graficos-novo")} 
             className="flex items-center gap-2 px-4 py-2 bg-slate-800 hover:bg-slate-700 border border-slate-700 rounded-lg text-sm font-medium transition-colors"
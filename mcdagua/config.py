@@ -21,6 +21,9 @@ def load_config(app):
     # Mantemos EXCEL_PATH por compatibilidade com códigos antigos
     app.config["EXCEL_PATH"] = app.config["PATH_GERAL"]
 
+    # Engine de leitura do Excel: "auto" (calamine se instalado), "calamine" ou "openpyxl"
+    app.config["EXCEL_ENGINE"] = os.getenv("EXCEL_ENGINE", "auto")
+
     # Configurações de Segurança e Cache
     app.config["APP_USERNAME"] = os.getenv("APP_USERNAME")
     app.config["APP_PASSWORD"] = os.getenv("APP_PASSWORD")
@@ -28,6 +31,29 @@ def load_config(app):
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 3600
     app.config["CACHE_TYPE"] = "SimpleCache"
     app.config["CACHE_DEFAULT_TIMEOUT"] = 300
+
+    # Orçamento (bytes, por worker) do cache das consultas de /api/geral, visa e
+    # haccp. 0 desliga o cache.
+    try:
+        app.config["QUERY_CACHE_MAX_BYTES"] = int(os.getenv("QUERY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    except ValueError:
+        app.config["QUERY_CACHE_MAX_BYTES"] = 64 * 1024 * 1024
+
+    # Dias que os jobs de ingestão já terminados ficam em '<planilhas>/ingestao'
+    try:
+        app.config["INGEST_JOBS_RETENTION_DAYS"] = int(os.getenv("INGEST_JOBS_RETENTION_DAYS", 7))
+    except ValueError:
+        app.config["INGEST_JOBS_RETENTION_DAYS"] = 7
+
+    # Minutos sem progresso até um job de ingestão em andamento ser dado como interrompido
+    try:
+        app.config["INGEST_JOB_TIMEOUT_MINUTES"] = int(os.getenv("INGEST_JOB_TIMEOUT_MINUTES", 30))
+    except ValueError:
+        app.config["INGEST_JOB_TIMEOUT_MINUTES"] = 30
+
+    # Pasta em memória compartilhada (ex: /dev/shm/mcdagua) para os workers do
+    # gunicorn mapearem os mesmos datasets. Vazio = cada worker com sua cópia.
+    app.config["SHARED_DATASETS_DIR"] = os.getenv("SHARED_DATASETS_DIR") or None
     
     try:
         app.config["REFRESH_INTERVAL"] = int(os.getenv("REFRESH_INTERVAL", 5))
@@ -0,0 +1,131 @@
+import os
+import glob
+import json
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows (desenvolvimento local): sem trava entre processos
+    fcntl = None
+
+# ==============================================================================
+# DATASETS COMPARTILHADOS ENTRE WORKERS (ARROW IPC EM /dev/shm)
+# ==============================================================================
+# Com `gunicorn -w 4` cada worker lia e guardava sua própria cópia das
+# planilhas. Quando SHARED_DATASETS_DIR está configurado (ex: /dev/shm/mcdagua),
+# o primeiro worker que precisar de um dataset grava o DataFrame limpo em um
+# arquivo Arrow IPC nessa pasta; todos os workers mapeiam o mesmo arquivo em
+# memória (mmap) e montam o DataFrame com colunas Arrow sem copiar os dados.
+#
+# Ao lado de cada arquivo fica um manifesto '<nome>.versao.json' com a versão
+# compartilhada do dataset, para que todos os workers enxerguem o mesmo número
+# de versão para o mesmo conteúdo.
+
+
+class _Trava:
+    """flock exclusivo em um arquivo; um worker materializa, os outros esperam."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = None
+
+    def __enter__(self):
+        self._arquivo = open(self.caminho, "a+")
+        if fcntl:
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_UN)
+        self._arquivo.close()
+
+
+class ArmazemCompartilhado:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho_arrow(self, nome, fingerprint):
+        return os.path.join(self.pasta, f"{nome}.{fingerprint[:20]}.arrow")
+
+    def _caminho_manifesto(self, nome):
+        return os.path.join(self.pasta, f"{nome}.versao.json")
+
+    def _ler_manifesto(self, nome):
+        try:
+            with open(self._caminho_manifesto(nome), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _gravar_manifesto(self, nome, manifesto):
+        destino = self._caminho_manifesto(nome)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+        os.replace(temporario, destino)
+
+    def _mapear(self, caminho):
+        import pyarrow as pa
+
+        # memory_map: as páginas do arquivo em /dev/shm são compartilhadas por
+        # todos os processos; ArrowDtype evita converter as colunas em objetos
+        # Python (o que criaria uma cópia por worker). Datas continuam como
+        # datetime64 do numpy para serializar igual ao carregamento local, e
+        # colunas dictionary voltam como category (só códigos + valores únicos).
+        def tipo_coluna(tipo):
+            if pa.types.is_timestamp(tipo) or pa.types.is_date(tipo) or pa.types.is_dictionary(tipo):
+                return None
+            return pd.ArrowDtype(tipo)
+
+        fonte = pa.memory_map(caminho, "r")
+        tabela = pa.ipc.open_file(fonte).read_all()
+        return tabela.to_pandas(types_mapper=tipo_coluna)
+
+    def _materializar(self, df, caminho):
+        import pyarrow as pa
+
+        tabela = pa.Table.from_pandas(df)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with pa.OSFile(temporario, "wb") as sink:
+            with pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+        os.replace(temporario, caminho)
+
+    def carregar(self, nome, fingerprint, carregar_df):
+        """
+        Retorna (versao, df) para o conteúdo identificado por `fingerprint`.
+        `carregar_df()` só é chamado pelo worker que materializa o arquivo.
+        """
+        caminho = self._caminho_arrow(nome, fingerprint)
+        manifesto = self._ler_manifesto(nome)
+
+        if manifesto.get("fingerprint") == fingerprint and os.path.exists(caminho):
+            return manifesto["versao"], self._mapear(caminho)
+
+        with _Trava(os.path.join(self.pasta, f"{nome}.lock")):
+            # Outro worker pode ter materializado enquanto esperávamos a trava
+            manifesto = self._ler_manifesto(nome)
+            if manifesto.get("fingerprint") == fingerprint and os.path.exists(caminho):
+                return manifesto["versao"], self._mapear(caminho)
+
+            df = carregar_df()
+            if df.empty:
+                return None, df
+
+            self._materializar(df, caminho)
+            versao = int(manifesto.get("versao", 0)) + 1
+            self._gravar_manifesto(nome, {"versao": versao, "fingerprint": fingerprint})
+
+            # Remove versões antigas; workers que ainda as mapeiam continuam
+            # válidos (o arquivo só some de fato quando o último mmap fechar).
+            for antigo in glob.glob(os.path.join(self.pasta, f"{nome}.*.arrow")):
+                if antigo != caminho:
+                    try:
+                        os.remove(antigo)
+                    except OSError:
+                        pass
+
+            print(f"🧠 [SHM] '{nome}' materializado em {caminho} (versão {versao}).")
+            return versao, self._mapear(caminho)
@@ -0,0 +1,84 @@
+import gzip
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # sem brotli: só gzip
+    brotli = None
+
+# ==============================================================================
+# RESPOSTAS COM ETag, 304 E CORPO PRÉ-COMPRIMIDO
+# ==============================================================================
+# Os dashboards se atualizam sozinhos e quase sempre pedem de novo os mesmos
+# dados. Com um ETag forte (que muda junto com a versão da planilha) o
+# navegador manda If-None-Match e recebe só um 304, sem corpo. Quando o corpo
+# precisa ir, vai comprimido (brotli se o pacote estiver instalado e o cliente
+# aceitar, senão gzip); quem guarda a resposta em cache guarda também as
+# versões comprimidas, então cada corpo é comprimido uma vez.
+#
+# Cada codificação tem o seu ETag (sufixo -gzip/-br), como pede o HTTP para
+# validadores fortes; no If-None-Match qualquer uma delas vale.
+
+# Corpos menores que isso vão sem compressão (o ganho não paga o custo)
+MINIMO_COMPRESSAO = 1024
+
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+def codificacao_aceita():
+    """Melhor Content-Encoding aceito pelo cliente ("br", "gzip" ou None)."""
+    aceitas = request.accept_encodings
+    if brotli is not None and aceitas["br"]:
+        return "br"
+    if aceitas["gzip"]:
+        return "gzip"
+    return None
+
+
+def comprimir(corpo, codificacao):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP)
+
+
+def nao_modificado(etag):
+    """True se o If-None-Match do request já cobre `etag` (em qualquer codificação)."""
+    condicao = request.if_none_match
+    if not condicao:
+        return False
+    return condicao.star_tag or any(condicao.contains(etag + s) for s in ("", "-gzip", "-br"))
+
+
+def resposta_304(etag):
+    resposta = current_app.response_class(status=304)
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.vary.add("Accept-Encoding")
+    return resposta
+
+
+def responder_bytes(corpo, mimetype, etag, codificados=None):
+    """
+    Resposta 200 com ETag forte e o corpo na melhor codificação aceita.
+    `codificados`: dict {codificação: bytes} onde as versões comprimidas são
+    guardadas e reaproveitadas (a entrada de cache da resposta).
+    """
+    if nao_modificado(etag):
+        return resposta_304(etag)
+
+    codificacao = codificacao_aceita() if len(corpo) >= MINIMO_COMPRESSAO else None
+    if codificacao is not None:
+        if codificados is None:
+            codificados = {}
+        if codificacao not in codificados:
+            codificados[codificacao] = comprimir(corpo, codificacao)
+        corpo = codificados[codificacao]
+
+    resposta = current_app.response_class(corpo, mimetype=mimetype)
+    resposta.set_etag(etag + (f"-{codificacao}" if codificacao else ""))
+    if codificacao is not None:
+        resposta.headers["Content-Encoding"] = codificacao
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.vary.add("Accept-Encoding")
+    return resposta
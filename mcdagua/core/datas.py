@@ -0,0 +1,113 @@
+import unicodedata
+import numpy as np
+import pandas as pd
+from mcdagua.core.tipos import texto_normalizado
+
+# ==============================================================================
+# DATAS E MESES CALCULADOS UMA VEZ NO CARREGAMENTO
+# ==============================================================================
+# Cada KPI copiava o DataFrame, rodava pd.to_datetime na coluna de data e
+# mapeava o nome do mês com o próprio meses_map, a cada requisição. Agora os
+# loaders acrescentam ao DataFrame colunas derivadas, calculadas uma vez por
+# versão da planilha:
+#   _data: datetime64 (NaT quando a célula não é uma data)
+#   _ano:  ano da _data (0 = sem data válida)
+#   _mes:  mês 1..12 pela coluna de texto 'mes' (mais confiável) e, se ela
+#          estiver vazia ou com texto desconhecido, pelo mês da _data (0 = sem mês)
+# Colunas que começam com "_" são internas: a API não as devolve.
+
+PREFIXO_DERIVADA = "_"
+
+MESES_MAP = {
+    "janeiro": 1, "fevereiro": 2, "março": 3, "marco": 3,
+    "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9,
+    "outubro": 10, "novembro": 11, "dezembro": 12
+}
+
+TERMOS_DATA = ['data_coleta', 'data', 'dt_coleta']
+TERMOS_MES = ['mes']
+
+
+def normalizar_texto(texto):
+    if not isinstance(texto, str): return str(texto)
+    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8').lower()
+
+
+def encontrar_coluna(df, termos_busca):
+    colunas_map = {normalizar_texto(c): c for c in colunas_publicas(df)}
+    for termo in termos_busca:
+        termo_norm = normalizar_texto(termo)
+        for col_norm, col_real in colunas_map.items():
+            if termo_norm in col_norm:
+                return col_real
+    return None
+
+
+def colunas_publicas(df):
+    return [c for c in df.columns if not str(c).startswith(PREFIXO_DERIVADA)]
+
+
+def sem_derivadas(df):
+    """DataFrame sem as colunas internas (_data, _ano, _mes...)."""
+    publicas = colunas_publicas(df)
+    if len(publicas) == df.shape[1]:
+        return df
+    return df[publicas]
+
+
+def converter_datas(serie):
+    """pd.to_datetime(errors='coerce') convertendo cada valor distinto uma vez."""
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return serie
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = pd.to_datetime(pd.Series(serie.cat.categories), errors='coerce')
+        valores = categorias.to_numpy().take(serie.cat.codes.to_numpy())
+        valores[serie.cat.codes.to_numpy() < 0] = np.datetime64("NaT")
+        return pd.Series(valores, index=serie.index, name=serie.name)
+    return pd.to_datetime(serie, errors='coerce')
+
+
+def numero_mes(serie):
+    """Nome do mês em português ('Março', ' marco ') -> 1..12; desconhecido -> NaN."""
+    return texto_normalizado(serie).map(MESES_MAP)
+
+
+def derivar_datas(df, data=None, mes=None):
+    """
+    Acrescenta _data/_ano/_mes ao DataFrame. `data` e `mes` são nomes de
+    coluna (ou uma Series já convertida, no caso de `data`); se omitidos,
+    procura as colunas pelos nomes usuais ('data_coleta', 'data', 'mes').
+    """
+    if df.empty:
+        return df
+
+    if data is None:
+        data = encontrar_coluna(df, TERMOS_DATA)
+    if mes is None:
+        mes = encontrar_coluna(df, TERMOS_MES)
+
+    novas = {}
+    mes_data = None
+    if data is not None:
+        datas = data if isinstance(data, pd.Series) else converter_datas(df[data])
+        datas = pd.to_datetime(datas, errors='coerce')
+        novas["_data"] = datas
+        novas["_ano"] = datas.dt.year.fillna(0).astype("int16")
+        mes_data = datas.dt.month
+    else:
+        novas["_ano"] = pd.Series(0, index=df.index, dtype="int16")
+
+    mes_num = numero_mes(df[mes]) if mes is not None else pd.Series(np.nan, index=df.index)
+    if mes_data is not None:
+        mes_num = mes_num.fillna(mes_data)
+    novas["_mes"] = mes_num.fillna(0).astype("int8")
+
+    return df.assign(**novas)
+
+
+def com_datas(df):
+    """Garante as colunas derivadas (frames que não vieram dos loaders)."""
+    if "_mes" in df.columns:
+        return df
+    return derivar_datas(df)
@@ -0,0 +1,59 @@
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # sem orjson: fica o json da biblioteca padrão
+    orjson = None
+
+# ==============================================================================
+# JSON RÁPIDO (orjson) PARA TODAS AS RESPOSTAS
+# ==============================================================================
+# O jsonify do Flask usa o json da biblioteca padrão, em Python puro na parte de
+# objetos: nas tabelas grandes (/api/geral) ele era boa parte do tempo da
+# resposta. Este provider troca o encoder pelo orjson (C, gera bytes direto)
+# mantendo o que o Flask fazia:
+#   - chaves ordenadas, datas no formato HTTP (http_date) e o mesmo fallback
+#     para Decimal/UUID/dataclasses;
+#   - indentado em modo debug.
+# Diferenças: NaN/Infinito viram null (JSON válido) e acentos saem em UTF-8 em
+# vez de \u00e7. Tipos do NumPy (int64, float32...) passam a ser aceitos.
+# Se o orjson não estiver instalado, tudo continua com o json padrão.
+
+if orjson is not None:
+    OPCOES_ORJSON = (
+        orjson.OPT_SORT_KEYS
+        | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATETIME  # datas pelo default do Flask (http_date)
+    )
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if o is pd.NaT:
+            return None
+        return DefaultJSONProvider.default(o)
+
+    def _opcoes(self, indent=None):
+        return OPCOES_ORJSON | (orjson.OPT_INDENT_2 if indent else 0)
+
+    def dumps_bytes(self, obj, **kwargs):
+        """JSON em bytes (UTF-8), sem passar por str."""
+        if orjson is None:
+            return self.dumps(obj, **kwargs).encode("utf-8")
+        return orjson.dumps(obj, default=self.default, option=self._opcoes(kwargs.get("indent")))
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, **kwargs).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        corpo = self.dumps_bytes(obj, indent=indent) + b"\n"
+        return self._app.response_class(corpo, mimetype=self.mimetype)
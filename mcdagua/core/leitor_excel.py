@@ -0,0 +1,87 @@
+import os
+import importlib.util
+import pandas as pd
+from flask import current_app, has_app_context
+
+# ==============================================================================
+# LEITOR DE PLANILHAS COM ENGINE CONFIGURÁVEL
+# ==============================================================================
+# Toda leitura de .xlsx (loaders, sessões de workbook, ranges) passa por aqui.
+# A engine vem da configuração EXCEL_ENGINE:
+#   - "auto" (padrão): calamine se o pacote python-calamine estiver instalado,
+#     senão openpyxl
+#   - "calamine" / "openpyxl": força a engine
+# Se a leitura com calamine falhar (arquivo com algo que ela não suporta),
+# tentamos de novo com openpyxl antes de desistir.
+
+# engine do pandas -> módulo Python necessário
+ENGINES = {
+    "calamine": "python_calamine",
+    "openpyxl": "openpyxl",
+}
+
+ENGINE_PADRAO = "openpyxl"
+
+
+def engine_disponivel(engine):
+    modulo = ENGINES.get(engine)
+    return bool(modulo) and importlib.util.find_spec(modulo) is not None
+
+
+def engines_disponiveis():
+    return [engine for engine in ENGINES if engine_disponivel(engine)]
+
+
+def escolher_engine(preferida=None):
+    """Resolve a engine a usar (config EXCEL_ENGINE, depois variável de ambiente)."""
+    if preferida is None:
+        if has_app_context():
+            preferida = current_app.config.get("EXCEL_ENGINE")
+        else:
+            preferida = os.getenv("EXCEL_ENGINE")
+
+    preferida = (preferida or "auto").strip().lower()
+
+    if preferida == "auto":
+        return "calamine" if engine_disponivel("calamine") else ENGINE_PADRAO
+
+    if not engine_disponivel(preferida):
+        print(f"⚠️ [EXCEL] Engine '{preferida}' indisponível, usando {ENGINE_PADRAO}.")
+        return ENGINE_PADRAO
+
+    return preferida
+
+
+def abrir_excel(path, engine=None):
+    """pd.ExcelFile com a engine configurada (fallback para openpyxl)."""
+    engine = engine or escolher_engine()
+    try:
+        return pd.ExcelFile(path, engine=engine)
+    except (FileNotFoundError, PermissionError):
+        raise
+    except Exception as e:
+        if engine == ENGINE_PADRAO:
+            raise
+        print(f"⚠️ [EXCEL] {engine} não abriu {os.path.basename(str(path))} ({e}); tentando {ENGINE_PADRAO}.")
+        return pd.ExcelFile(path, engine=ENGINE_PADRAO)
+
+
+def ler_excel(fonte, engine=None, **kwargs):
+    """
+    pd.read_excel com a engine configurada. `fonte` pode ser um caminho ou um
+    pd.ExcelFile já aberto (nesse caso usa a engine com que ele foi aberto).
+    """
+    if isinstance(fonte, pd.ExcelFile):
+        return pd.read_excel(fonte, **kwargs)
+
+    engine = engine or escolher_engine()
+    try:
+        return pd.read_excel(fonte, engine=engine, **kwargs)
+    except (FileNotFoundError, PermissionError, ValueError):
+        # ValueError = aba inexistente: os loaders tratam (fallback de aba)
+        raise
+    except Exception as e:
+        if engine == ENGINE_PADRAO:
+            raise
+        print(f"⚠️ [EXCEL] {engine} falhou em {os.path.basename(str(fonte))} ({e}); tentando {ENGINE_PADRAO}.")
+        return pd.read_excel(fonte, engine=ENGINE_PADRAO, **kwargs)
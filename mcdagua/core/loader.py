@@ -1,6 +1,11 @@
 import pandas as pd
 from flask import current_app
 from mcdagua.extensions import cache
+from mcdagua.core.registry import datasets
+from mcdagua.core.workbook import abrir_sessao
+from mcdagua.core.leitor_excel import ler_excel
+from mcdagua.core.tipos import compactar_tipos
+from mcdagua.core.datas import derivar_datas
 
 # ==============================================================================
 # 1. LOADER GERAL (POTABILIDADE)
@@ -10,19 +15,18 @@ def load_geral_dataframe():
     Carrega a planilha de Potabilidade (Geral).
     Lê a configuração 'PATH_GERAL' do .env.
     """
-    path = current_app.config.get("PATH_GERAL")
-    
-    if not path:
-        print("⚠️ [LOADER] PATH_GERAL não configurado.")
-        return pd.DataFrame()
+    return get_dataset("geral").df
 
+
+def _ler_geral_xlsx(path):
+    """Lê e limpa a aba GERAL direto do .xlsx (sem snapshot)."""
     try:
         # Tenta ler a aba "GERAL" com header na linha 2 (índice 1)
-        df = pd.read_excel(path, sheet_name="GERAL", header=1)
+        df = ler_excel(path, sheet_name="GERAL", header=1)
     except ValueError:
         # Fallback: Se não achar a aba "GERAL", tenta ler a primeira aba
         try:
-            df = pd.read_excel(path, header=1)
+            df = ler_excel(path, header=1)
         except Exception as e:
             print(f"❌ [GERAL] Erro crítico ao ler arquivo: {e}")
             return pd.DataFrame()
@@ -53,7 +57,7 @@ def load_geral_dataframe():
     for col in df.select_dtypes(include=['object']).columns:
         df[col] = df[col].astype(str).str.strip()
 
-    return df
+    return derivar_datas(compactar_tipos(df))
 
 
 # ==============================================================================
@@ -64,14 +68,13 @@ def load_visa_dataframe():
     Carrega a planilha da VISA.
     Aba esperada: 'Consolidado Coletas'
     """
-    path = current_app.config.get("PATH_VISA")
+    return get_dataset("visa").df
 
-    if not path:
-        print("⚠️ [LOADER] PATH_VISA não configurado.")
-        return pd.DataFrame()
 
+def _ler_visa_xlsx(path):
+    """Lê e limpa a aba 'Consolidado Coletas' direto do .xlsx (sem snapshot)."""
     try:
-        df = pd.read_excel(path, sheet_name="Consolidado Coletas")
+        df = ler_excel(path, sheet_name="Consolidado Coletas")
         
         df.columns = (
             df.columns
@@ -93,7 +96,7 @@ def load_visa_dataframe():
         for col in df.select_dtypes(include=['object']).columns:
             df[col] = df[col].astype(str).str.strip()
             
-        return df
+        return derivar_datas(compactar_tipos(df))
 
     except Exception as e:
         print(f"❌ [VISA] Erro ao carregar aba 'Consolidado Coletas': {e}")
@@ -108,18 +111,17 @@ def load_haccp_dataframe():
     Carrega a planilha de HACCP (Tabela de Dados).
     Aba esperada: 'GERAL' ou 'HACCP'
     """
-    path = current_app.config.get("PATH_HACCP")
+    return get_dataset("haccp").df
 
-    if not path:
-        print("⚠️ [LOADER] PATH_HACCP não configurado.")
-        return pd.DataFrame()
 
+def _ler_haccp_xlsx(path):
+    """Lê e limpa a aba GERAL/HACCP direto do .xlsx (sem snapshot)."""
     try:
-        df = pd.read_excel(path, sheet_name="GERAL", header=1)
+        df = ler_excel(path, sheet_name="GERAL", header=1)
     except ValueError:
         try:
             print("⚠️ [HACCP] Aba 'GERAL' não encontrada, tentando 'HACCP'...")
-            df = pd.read_excel(path, sheet_name="HACCP", header=1)
+            df = ler_excel(path, sheet_name="HACCP", header=1)
         except Exception as e:
             print(f"❌ [HACCP] Erro crítico: Nem aba 'GERAL' nem 'HACCP' encontradas: {e}")
             return pd.DataFrame()
@@ -137,7 +139,7 @@ def load_haccp_dataframe():
     for col in df.select_dtypes(include=['object']).columns:
         df[col] = df[col].astype(str).str.strip()
 
-    return df
+    return derivar_datas(compactar_tipos(df))
 
 
 # ==============================================================================
@@ -148,7 +150,7 @@ class GraficoPendenciaLoader:
         self.path = current_app.config.get("PATH_GERAL")
         try:
             # Carrega a aba sem cabeçalho para usar índices numéricos absolutos (A=0, K=10)
-            self.df = pd.read_excel(self.path, sheet_name="GRÁFICO PENDENCIA", header=None)
+            self.df = ler_excel(self.path, sheet_name="GRÁFICO PENDENCIA", header=None)
         except Exception as e:
             print(f"❌ [GRÁFICOS] Erro ao abrir aba 'GRÁFICO PENDENCIA': {e}")
             self.df = pd.DataFrame()
@@ -271,10 +273,19 @@ class GraficoPendenciaLoader:
 # 5. FUNÇÕES HELPER EXPORTADAS
 # ==============================================================================
 
+datasets.registrar("geral", "PATH_GERAL", _ler_geral_xlsx)
+datasets.registrar("visa", "PATH_VISA", _ler_visa_xlsx)
+datasets.registrar("haccp", "PATH_HACCP", _ler_haccp_xlsx)
+
+def get_dataset(nome):
+    """Snapshot compartilhado (DataFrame + versão) de 'geral', 'visa' ou 'haccp'."""
+    return datasets.obter(nome)
+
 def get_dataframe():
     return load_geral_dataframe()
 
 def refresh_dataframe():
+    datasets.invalidar()
     cache.clear()
     print("🧹 [CACHE] Cache limpo.")
 
@@ -287,15 +298,17 @@ def load_all_graphics():
 # ==============================================================================
 # 6. LOADER ESPECÍFICO PARA GRÁFICOS HACCP
 # ==============================================================================
-def load_haccp_graphics_data():
+def load_haccp_graphics_data(path=None):
     """
     Carrega dados da aba 'GRÁFICO' do arquivo HACCP.
     """
-    path = current_app.config.get("PATH_HACCP")
+    path = path or current_app.config.get("PATH_HACCP")
     if not path: return {}
 
     try:
-        df = pd.read_excel(path, sheet_name="GRÁFICO", header=None)
+        df = abrir_sessao(path).aba("GRÁFICO")
+        if df is None:
+            raise ValueError("Worksheet named 'GRÁFICO' not found")
         resultados = {
             "regional": {}, 
             "consultor": {},
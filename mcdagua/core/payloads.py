@@ -0,0 +1,105 @@
+import os
+import glob
+import threading
+from flask import current_app
+from mcdagua.core.snapshot import fingerprint_arquivo
+
+# ==============================================================================
+# PAYLOADS MATERIALIZADOS (JSON PRONTO EM DISCO)
+# ==============================================================================
+# Respostas que dependem só do arquivo enviado (ex: /api/graficos-data) são
+# calculadas uma vez por versão da planilha e gravadas como JSON pronto na
+# pasta 'payloads' ao lado do .xlsx. O nome do arquivo leva a impressão
+# digital do conteúdo da planilha, que também vira o ETag da resposta: todos os
+# workers servem os mesmos bytes e o mesmo ETag para a mesma versão.
+
+PASTA_PAYLOADS = "payloads"
+
+# Incrementar quando o formato de algum payload mudar (invalida os antigos)
+VERSAO_PAYLOADS = 1
+
+# Último payload de cada tipo em memória (com as versões comprimidas): nome -> Payload
+_memoria = {}
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+class Payload:
+    def __init__(self, nome, fingerprint, corpo):
+        self.nome = nome
+        self.fingerprint = fingerprint
+        self.corpo = corpo
+        self.codificados = {}   # "gzip"/"br" -> corpo comprimido (core/compressao.py)
+
+    @property
+    def etag(self):
+        return f"{self.nome}-v{VERSAO_PAYLOADS}-{self.fingerprint[:20]}"
+
+
+def _prefixo(path, nome):
+    pasta = os.path.join(os.path.dirname(os.path.abspath(path)), PASTA_PAYLOADS)
+    return os.path.join(pasta, f"{nome}.v{VERSAO_PAYLOADS}")
+
+
+def _caminho(path, nome, fingerprint):
+    return f"{_prefixo(path, nome)}.{fingerprint[:20]}.json"
+
+
+def _lock(nome):
+    with _locks_lock:
+        return _locks.setdefault(nome, threading.Lock())
+
+
+def materializar_payload(nome, path, montar):
+    """
+    Calcula `montar(path)`, grava o JSON e devolve o Payload. Chamado pela
+    ingestão logo após publicar a planilha e, como fallback, na primeira
+    requisição de uma versão ainda sem payload.
+    """
+    # Caminho não configurado: payload calculado na hora, sem versão em disco
+    fingerprint = fingerprint_arquivo(path) if path else None
+    corpo = current_app.json.dumps(montar(path)).encode("utf-8")
+    if not fingerprint:
+        return Payload(nome, "sem-arquivo", corpo)
+
+    destino = _caminho(path, nome, fingerprint)
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(corpo)
+        os.replace(temporario, destino)
+        for antigo in glob.glob(f"{_prefixo(path, nome)}.*.json"):
+            if antigo != destino:
+                os.remove(antigo)
+    except OSError as e:
+        print(f"⚠️ [PAYLOADS] Não foi possível gravar '{nome}': {e}")
+
+    payload = Payload(nome, fingerprint, corpo)
+    _memoria[nome] = payload
+    print(f"💾 [PAYLOADS] '{nome}' materializado ({len(corpo)} bytes).")
+    return payload
+
+
+def obter_payload(nome, path, montar):
+    """Payload da versão atual da planilha: memória -> disco -> cálculo."""
+    fingerprint = fingerprint_arquivo(path) if path else None
+    if fingerprint:
+        em_memoria = _memoria.get(nome)
+        if em_memoria and em_memoria.fingerprint == fingerprint:
+            return em_memoria
+
+    with _lock(nome):
+        if fingerprint:
+            em_memoria = _memoria.get(nome)
+            if em_memoria and em_memoria.fingerprint == fingerprint:
+                return em_memoria
+
+            destino = _caminho(path, nome, fingerprint)
+            if os.path.exists(destino):
+                with open(destino, "rb") as f:
+                    corpo = f.read()
+                _memoria[nome] = Payload(nome, fingerprint, corpo)
+                return _memoria[nome]
+
+        return materializar_payload(nome, path, montar)
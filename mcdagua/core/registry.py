@@ -0,0 +1,185 @@
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+from flask import current_app
+from mcdagua.core.snapshot import carregar_com_snapshot, fingerprint_arquivo
+from mcdagua.core.compartilhado import ArmazemCompartilhado
+
+# ==============================================================================
+# REGISTRO DE DATASETS EM MEMÓRIA
+# ==============================================================================
+# Mantém os DataFrames de Geral/VISA/HACCP carregados no processo. A cada
+# acesso o arquivo é revalidado por tamanho/mtime (os.stat) e, só se isso
+# mudar, pelo sha1 do conteúdo. Cada recarga real recebe um número de versão
+# novo (monotônico), que rotas e caches usam para saber se os dados mudaram.
+
+
+class Dataset:
+    """
+    Snapshot imutável de uma planilha carregada.
+    O mesmo objeto é entregue a todas as rotas e KPIs enquanto o arquivo não
+    mudar: nunca altere `df` in place (use .copy() ou filtros).
+    """
+
+    def __init__(self, nome, versao, df, path=None, fingerprint=None):
+        self.nome = nome
+        self.versao = versao
+        self.df = df
+        self.path = path
+        self.fingerprint = fingerprint
+        self.carregado_em = datetime.now()
+        self._memo = {}
+        self._lock_memo = threading.RLock()  # um índice pode usar outro (catálogo -> filtros)
+
+    @property
+    def vazio(self):
+        return self.df.empty
+
+    def memo(self, chave, calcular):
+        """
+        Estruturas derivadas desta versão (índices de busca, filtros...):
+        calculadas uma vez e descartadas junto com o Dataset quando a planilha muda.
+        """
+        if chave not in self._memo:
+            with self._lock_memo:
+                if chave not in self._memo:
+                    self._memo[chave] = calcular()
+        return self._memo[chave]
+
+    def __repr__(self):
+        return f"<Dataset {self.nome} v{self.versao} ({len(self.df)} linhas)>"
+
+
+class DatasetRegistry:
+    def __init__(self):
+        self._fontes = {}      # nome -> (config_key, leitor)
+        self._datasets = {}    # nome -> Dataset
+        self._assinaturas = {} # nome -> (path, tamanho, mtime_ns)
+        self._locks = {}
+        self._lock_versao = threading.Lock()
+        self._ultima_versao = 0
+        self._versoes = {}     # nome -> última versão entregue
+        self._armazem = None
+
+    def registrar(self, nome, config_key, leitor):
+        """Associa um dataset à chave de configuração do caminho e à função que lê o .xlsx."""
+        self._fontes[nome] = (config_key, leitor)
+        self._locks[nome] = threading.Lock()
+
+    def __contains__(self, nome):
+        return nome in self._fontes
+
+    def leitor(self, nome):
+        """Função que lê e limpa o .xlsx do dataset (sem snapshot nem cache)."""
+        return self._fontes[nome][1]
+
+    def _versao_nova(self, nome, compartilhada=None):
+        """
+        Versão do conteúdo novo de `nome`: a do manifesto compartilhado quando
+        ela avança, senão a próxima do processo. Nunca repete nem volta em
+        relação à última entregue, mesmo alternando entre SHM e carga local.
+        """
+        with self._lock_versao:
+            anterior = self._versoes.get(nome, 0)
+            if compartilhada is not None and compartilhada > anterior:
+                versao = compartilhada
+            else:
+                versao = max(self._ultima_versao, anterior) + 1
+            self._ultima_versao = max(self._ultima_versao, versao)
+            self._versoes[nome] = versao
+            return versao
+
+    def _armazem_compartilhado(self):
+        """Armazém em memória compartilhada (SHARED_DATASETS_DIR), se habilitado."""
+        pasta = current_app.config.get("SHARED_DATASETS_DIR")
+        if not pasta:
+            return None
+        if self._armazem is None or self._armazem.pasta != pasta:
+            try:
+                import pyarrow  # noqa: F401
+                self._armazem = ArmazemCompartilhado(pasta)
+            except Exception as e:
+                print(f"⚠️ [SHM] Compartilhamento desativado ({e}); cada worker carrega sua cópia.")
+                current_app.config["SHARED_DATASETS_DIR"] = None
+                return None
+        return self._armazem
+
+    def _carregar(self, nome, path, fingerprint, leitor):
+        armazem = self._armazem_compartilhado()
+        if armazem is not None:
+            try:
+                versao, df = armazem.carregar(
+                    nome, fingerprint, lambda: carregar_com_snapshot(path, nome, leitor)
+                )
+                return self._versao_nova(nome, versao), df
+            except Exception as e:
+                print(f"⚠️ [SHM] Falha ao usar '{nome}' compartilhado, carregando localmente: {e}")
+
+        return self._versao_nova(nome), carregar_com_snapshot(path, nome, leitor)
+
+    def _assinatura(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_size, st.st_mtime_ns)
+
+    def obter(self, nome):
+        """Retorna o Dataset atual, recarregando apenas se o arquivo mudou."""
+        if nome not in self._fontes:
+            raise KeyError(f"Dataset desconhecido: {nome}")
+
+        config_key, leitor = self._fontes[nome]
+        path = current_app.config.get(config_key)
+
+        if not path:
+            print(f"⚠️ [LOADER] {config_key} não configurado.")
+            return Dataset(nome, 0, pd.DataFrame())
+
+        assinatura = self._assinatura(path)
+        atual = self._datasets.get(nome)
+        if atual is not None and assinatura is not None and self._assinaturas.get(nome) == assinatura:
+            return atual
+
+        with self._locks[nome]:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock
+            atual = self._datasets.get(nome)
+            assinatura = self._assinatura(path)
+            if atual is not None and assinatura is not None and self._assinaturas.get(nome) == assinatura:
+                return atual
+
+            if assinatura is None:
+                # Arquivo ausente: não guarda nada, o próximo acesso tenta de novo
+                self._datasets.pop(nome, None)
+                self._assinaturas.pop(nome, None)
+                return Dataset(nome, 0, leitor(path), path)
+
+            fingerprint = fingerprint_arquivo(path)
+
+            # mtime mudou mas o conteúdo é o mesmo (ex: cópia/touch): mantém a versão
+            if atual is not None and atual.path == path and atual.fingerprint == fingerprint:
+                self._assinaturas[nome] = assinatura
+                return atual
+
+            versao, df = self._carregar(nome, path, fingerprint, leitor)
+            novo = Dataset(nome, versao, df, path, fingerprint)
+            self._datasets[nome] = novo
+            self._assinaturas[nome] = assinatura
+            print(f"📥 [DATASETS] '{nome}' carregado: versão {novo.versao}, {len(df)} linhas.")
+            return novo
+
+    def versao(self, nome):
+        return self.obter(nome).versao
+
+    def invalidar(self, nome=None):
+        """
+        Força a revalidação do(s) dataset(s) no próximo acesso. A versão só
+        muda se o conteúdo do arquivo tiver realmente mudado.
+        """
+        nomes = [nome] if nome else list(self._assinaturas)
+        for n in nomes:
+            self._assinaturas.pop(n, None)
+
+
+datasets = DatasetRegistry()
@@ -0,0 +1,129 @@
+import os
+import glob
+import hashlib
+import pandas as pd
+
+# ==============================================================================
+# SNAPSHOTS COLUNARES (PARQUET) DAS PLANILHAS
+# ==============================================================================
+# Cada planilha carregada gera um arquivo .parquet já limpo e tipado na pasta
+# 'snapshots' ao lado do .xlsx. O nome do arquivo leva a impressão digital
+# (sha1) do conteúdo da planilha: enquanto o .xlsx não mudar, os loaders leem
+# o parquet (milissegundos) em vez de reprocessar o Excel (segundos).
+
+PASTA_SNAPSHOTS = "snapshots"
+
+# Incrementar sempre que a limpeza dos loaders mudar, para invalidar os
+# snapshots gravados pela versão anterior do código.
+VERSAO_SNAPSHOT = 3
+
+# Cache em memória: path -> (tamanho, mtime_ns, sha1). Evita recalcular o hash
+# do arquivo inteiro a cada requisição quando nada mudou no disco.
+_fingerprints = {}
+
+
+def fingerprint_arquivo(path):
+    """
+    Retorna o sha1 do conteúdo do arquivo (ou None se não existir).
+    O hash só é recalculado quando tamanho ou data de modificação mudam.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    chave = (st.st_size, st.st_mtime_ns)
+    cacheado = _fingerprints.get(path)
+    if cacheado and cacheado[:2] == chave:
+        return cacheado[2]
+
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    digest = h.hexdigest()
+
+    _fingerprints[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def _pasta_snapshots(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), PASTA_SNAPSHOTS)
+
+
+def _prefixo_snapshot(path, nome):
+    base = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(_pasta_snapshots(path), f"{base}.{nome}.v{VERSAO_SNAPSHOT}")
+
+
+def caminho_snapshot(path, nome, fingerprint):
+    return f"{_prefixo_snapshot(path, nome)}.{fingerprint[:20]}.parquet"
+
+
+def ler_snapshot(path, nome, fingerprint=None):
+    """Lê o snapshot válido para o conteúdo atual da planilha, se existir."""
+    fingerprint = fingerprint or fingerprint_arquivo(path)
+    if not fingerprint:
+        return None
+
+    destino = caminho_snapshot(path, nome, fingerprint)
+    if not os.path.exists(destino):
+        return None
+
+    try:
+        return pd.read_parquet(destino)
+    except Exception as e:
+        print(f"⚠️ [SNAPSHOT] Snapshot ilegível ({os.path.basename(destino)}), reprocessando: {e}")
+        return None
+
+
+def salvar_snapshot(path, nome, df, fingerprint=None):
+    """
+    Grava o DataFrame limpo como parquet e remove snapshots antigos da mesma
+    planilha. Falhas aqui nunca quebram o carregamento: no pior caso o
+    próximo acesso volta a ler o Excel.
+    """
+    fingerprint = fingerprint or fingerprint_arquivo(path)
+    if not fingerprint or df is None or df.empty:
+        return None
+
+    destino = caminho_snapshot(path, nome, fingerprint)
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Grava em arquivo temporário e renomeia: outro worker nunca enxerga
+        # um parquet pela metade.
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        df.to_parquet(temporario)
+        os.replace(temporario, destino)
+    except Exception as e:
+        print(f"⚠️ [SNAPSHOT] Não foi possível gravar snapshot de '{nome}': {e}")
+        return None
+
+    for antigo in glob.glob(f"{_prefixo_snapshot(path, nome)}.*.parquet"):
+        if antigo != destino:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+    return destino
+
+
+def carregar_com_snapshot(path, nome, leitor):
+    """
+    Devolve o DataFrame da planilha usando o snapshot quando a impressão
+    digital bate; caso contrário chama `leitor(path)` e grava o resultado.
+    """
+    fingerprint = fingerprint_arquivo(path)
+    if fingerprint:
+        df = ler_snapshot(path, nome, fingerprint)
+        if df is not None:
+            return df
+
+    df = leitor(path)
+
+    # Só grava se o arquivo não mudou durante a leitura (upload concorrente)
+    if fingerprint and not df.empty and fingerprint_arquivo(path) == fingerprint:
+        salvar_snapshot(path, nome, df, fingerprint)
+
+    return df
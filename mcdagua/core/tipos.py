@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# TIPOS COMPACTOS PARA OS DATAFRAMES CARREGADOS
+# ==============================================================================
+# Os loaders terminam com fillna("") + astype(str).str.strip(): cada célula vira
+# um objeto str do Python, mesmo em colunas com poucos valores distintos
+# (regional, mês, tipo_de_coleta, gm, colunas OK/NOK/NA...). Aqui essas colunas
+# viram categorias do pandas (um código inteiro por linha + a lista de valores
+# distintos) e colunas inteiras usam o menor inteiro que comporta os valores.
+#
+# Os valores continuam os mesmos strings (inclusive "" para célula vazia), então
+# to_dict/astype(str) e os filtros da API enxergam exatamente o mesmo conteúdo.
+
+# Coluna de texto vira categoria se tiver no máximo esta fração de valores distintos
+FRACAO_MAX_CATEGORIA = 0.5
+
+
+def compactar_tipos(df):
+    """Converte colunas de texto repetitivo em category e rebaixa inteiros."""
+    if df.empty:
+        return df
+
+    df = df.copy()
+    limite = max(1, int(len(df) * FRACAO_MAX_CATEGORIA))
+
+    # Por posição: a planilha pode ter nomes de coluna repetidos
+    for i in range(df.shape[1]):
+        serie = df.iloc[:, i]
+        if serie.dtype == object:
+            if serie.nunique(dropna=False) <= limite:
+                df.isetitem(i, serie.astype("category"))
+        elif isinstance(serie.dtype, np.dtype) and serie.dtype.kind in "iu":
+            df.isetitem(i, pd.to_numeric(serie, downcast="integer"))
+
+    return df
+
+
+def texto_normalizado(serie, strip=True):
+    """
+    str(valor).lower() (e .strip()) da coluna inteira. Em colunas category a
+    normalização roda só nos valores distintos e é expandida pelos códigos.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories.astype(str).str.lower()
+        if strip:
+            categorias = categorias.str.strip()
+        valores = np.asarray(categorias, dtype=object).take(serie.cat.codes.to_numpy())
+        # Código -1 = NaN (não acontece depois do fillna(""), mas por garantia)
+        valores[serie.cat.codes.to_numpy() < 0] = "nan"
+        return pd.Series(valores, index=serie.index, name=serie.name)
+    texto = serie.astype(str).str.lower()
+    return texto.str.strip() if strip else texto
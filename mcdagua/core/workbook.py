@@ -0,0 +1,167 @@
+import threading
+import unicodedata
+import pandas as pd
+from mcdagua.core.snapshot import fingerprint_arquivo
+from mcdagua.core.leitor_excel import abrir_excel, ler_excel
+
+# ==============================================================================
+# SESSÃO DE WORKBOOK (UMA ABERTURA POR VERSÃO DO ARQUIVO)
+# ==============================================================================
+# A rota /api/graficos-data abria a mesma planilha ~10 vezes (pd.ExcelFile por
+# range, openpyxl por processador, read_excel da aba GERAL...). A sessão abre o
+# arquivo uma única vez, lê cada aba inteira (header=None) só na primeira vez
+# que alguém pede e serve ranges, tabelas e linhas a partir dessa leitura.
+# As sessões ficam em cache por impressão digital do arquivo: um novo upload
+# gera uma sessão nova automaticamente.
+
+
+def normalizar_nome_aba(txt):
+    return unicodedata.normalize('NFKD', str(txt)).encode('ASCII', 'ignore').decode('utf-8').lower().strip()
+
+
+def encontrar_aba(sheet_names, nome_alvo):
+    """Procura a aba ignorando acentos, maiúsculas e espaços nas pontas."""
+    nome_alvo_norm = normalizar_nome_aba(nome_alvo)
+    for sheet in sheet_names:
+        if normalizar_nome_aba(sheet) == nome_alvo_norm:
+            return sheet
+    return None
+
+
+def indices_colunas_excel(usecols):
+    """Converte 'K:O' (ou 'A,C,E:F') em índices 0-based: [10, 11, 12, 13, 14]."""
+    def letra_para_indice(letras):
+        n = 0
+        for ch in letras.strip().upper():
+            n = n * 26 + (ord(ch) - ord('A') + 1)
+        return n - 1
+
+    indices = []
+    for parte in str(usecols).split(','):
+        if ':' in parte:
+            ini, fim = parte.split(':')
+            indices.extend(range(letra_para_indice(ini), letra_para_indice(fim) + 1))
+        else:
+            indices.append(letra_para_indice(parte))
+    return indices
+
+
+class WorkbookSession:
+    def __init__(self, path, fingerprint=None):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._xls = None
+        self._abas = {}
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    @property
+    def xls(self):
+        if self._xls is None:
+            self._xls = abrir_excel(self.path)
+        return self._xls
+
+    @property
+    def sheet_names(self):
+        return self.xls.sheet_names
+
+    def nome_aba(self, nome_alvo):
+        return encontrar_aba(self.sheet_names, nome_alvo)
+
+    def aba(self, nome_alvo):
+        """
+        Aba inteira sem cabeçalho (índices numéricos = posição no Excel:
+        linha 1 -> 0, coluna A -> 0). Retorna None se a aba não existir.
+        """
+        with self._lock:
+            aba = self.nome_aba(nome_alvo)
+            if not aba:
+                return None
+            if aba not in self._abas:
+                self._abas[aba] = ler_excel(self.xls, sheet_name=aba, header=None)
+            return self._abas[aba]
+
+    def ler_range(self, nome_aba, range_str, usecols=None):
+        """
+        Equivalente a ler_range_exato: linhas 'inicio:fim' (1-based, como no
+        Excel) e colunas 'K:O', com índices de coluna renumerados 0, 1, 2...
+        """
+        bruto = self.aba(nome_aba)
+        if bruto is None:
+            return None
+
+        start_row, end_row = map(int, range_str.split(':'))
+        df = bruto.iloc[start_row - 1:end_row]
+        if usecols is not None:
+            cols = [c for c in indices_colunas_excel(usecols) if c < bruto.shape[1]]
+            df = df.iloc[:, cols]
+
+        # O read_excel descarta linhas totalmente vazias e infere o tipo só
+        # com os valores do range; reproduzimos isso para manter o resultado.
+        df = df.dropna(how="all").infer_objects().reset_index(drop=True)
+        if not df.empty:
+            df.columns = range(df.shape[1])
+        return df
+
+    def tabela(self, nome_aba, header=0):
+        """
+        Aba como tabela, usando a linha `header` (0-based) como cabeçalho,
+        no mesmo formato de pd.read_excel(..., header=header).
+        """
+        bruto = self.aba(nome_aba)
+        if bruto is None:
+            return None
+
+        nomes = []
+        vistos = {}
+        for i, valor in enumerate(bruto.iloc[header] if len(bruto) > header else []):
+            nome = f"Unnamed: {i}" if pd.isna(valor) else str(valor)
+            if nome in vistos:
+                vistos[nome] += 1
+                nome = f"{nome}.{vistos[nome]}"
+            else:
+                vistos[nome] = 0
+            nomes.append(nome)
+
+        df = bruto.iloc[header + 1:].dropna(how="all").infer_objects().reset_index(drop=True)
+        df.columns = nomes
+        return df
+
+    def memo(self, chave, calcular):
+        """Guarda resultados derivados desta versão do arquivo (calculados uma vez)."""
+        if chave not in self._memo:
+            self._memo[chave] = calcular()
+        return self._memo[chave]
+
+    def linhas(self, nome_aba, min_row=1, max_col=None):
+        """
+        Itera as linhas como listas de valores (None nas células vazias), no
+        estilo de ws.iter_rows(values_only=True) do openpyxl.
+        """
+        bruto = self.aba(nome_aba)
+        if bruto is None:
+            raise KeyError(f"Worksheet {nome_aba} does not exist.")
+
+        largura = max_col or bruto.shape[1]
+        dados = bruto.iloc[min_row - 1:, :largura].astype(object)
+        dados = dados.where(dados.notna(), None)
+        for linha in dados.itertuples(index=False, name=None):
+            linha = list(linha)
+            if len(linha) < largura:
+                linha.extend([None] * (largura - len(linha)))
+            yield linha
+
+
+_sessoes = {}
+_sessoes_lock = threading.Lock()
+
+
+def abrir_sessao(path):
+    """Sessão compartilhada do arquivo; renovada quando o conteúdo muda."""
+    fingerprint = fingerprint_arquivo(path)
+    with _sessoes_lock:
+        sessao = _sessoes.get(path)
+        if sessao is None or sessao.fingerprint != fingerprint:
+            sessao = WorkbookSession(path, fingerprint)
+            _sessoes[path] = sessao
+        return sessao
@@ -1,43 +1,78 @@
 import os
 import datetime
-from flask import Blueprint, request, jsonify, current_app
-from mcdagua.extensions import cache
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 import pandas as pd
 import numpy as np
 
 # --- IMPORTAÇÕES CORRETAS ---
 from mcdagua.core.loader import (
     load_geral_dataframe, 
-    load_visa_dataframe, 
-    load_haccp_dataframe
+    get_dataset
 )
-from mcdagua.services.filters import apply_filters
+from mcdagua.services.consulta import consultar, ler_formato, ler_projecao, ler_stream, ParametroInvalido
+from mcdagua.services.facetas import calcular_facetas
+from mcdagua.services.cache_consultas import cache_consulta
+from mcdagua.services.catalogo import catalogo
+from mcdagua.services.agregacao import agregar
+from mcdagua.services.exportacao import FORMATOS_EXPORTACAO, exportar, ler_formato_exportacao
 from mcdagua.services.kpis import get_programado_realizado
 
 api_bp = Blueprint("api", __name__)
 
+def responder_tabela(resultado, modo, resposta):
+    """
+    Resposta das rotas de tabela: `resposta` já tem tudo menos "dados".
+    ?format=ndjson e ?stream=1 geram o corpo em lotes (ver services/consulta.py).
+    """
+    formato = ler_formato(request.args)
+    codificar = current_app.json.dumps_bytes
+
+    # Sem isso o nginx acumula o corpo todo antes de repassar
+    cabecalhos = {"X-Accel-Buffering": "no"}
+
+    if formato == "ndjson":
+        cabecalhos["X-Total-Registros"] = str(resultado.total)
+        if resultado.paginacao and resultado.paginacao.get("proximo_cursor"):
+            cabecalhos["X-Proximo-Cursor"] = resultado.paginacao["proximo_cursor"]
+        corpo = resultado.ndjson(modo, codificar)
+        return current_app.response_class(
+            stream_with_context(corpo), mimetype="application/x-ndjson", headers=cabecalhos
+        )
+
+    if ler_stream(request.args):
+        corpo = resultado.json_em_partes(resposta, modo, formato, codificar)
+        return current_app.response_class(
+            stream_with_context(corpo), mimetype="application/json", headers=cabecalhos
+        )
+
+    resposta["dados"] = resultado.dados(modo, formato)
+    return jsonify(resposta)
+
 # -----------------------------
 # 3. API DE DADOS (/api/geral)
 # -----------------------------
 @api_bp.route("/geral")
-@cache.cached(timeout=10, query_string=True)
+@cache_consulta("geral")
 def api_geral():
     try:
         # Carrega do loader correto (Potabilidade)
-        df = load_geral_dataframe()
+        dataset = get_dataset("geral")
         
-        # Aplica filtros (busca e colunas específicas)
-        df = apply_filters(df, request.args)
-        
-        data_json = df.astype(str).to_dict(orient="records")
-        colunas = list(df.columns)
+        # Aplica filtros (busca e colunas específicas) e a paginação, se pedida
+        resultado = consultar(dataset, request.args)
+        colunas = resultado.colunas
 
-        return jsonify({
-            "total_registros": len(data_json),
+        resposta = {
+            "total_registros": resultado.total,
             "colunas": colunas,
-            "dados": data_json
-        })
+        }
+        if resultado.paginacao:
+            resposta["paginacao"] = resultado.paginacao
+        # Tudo como texto (o astype(str) de sempre), direto dos vetores da versão
+        return responder_tabela(resultado, "texto", resposta)
 
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -49,70 +84,73 @@ def api_geral():
 # mcdagua/routes/api.py
 
 @api_bp.route("/filtros-opcoes")
-@cache.cached(timeout=300)
 def api_filtros_opcoes():
     """Retorna listas de valores únicos para TODAS as colunas do DataFrame"""
     try:
-        df = load_geral_dataframe()
-        
-        opcoes = {}
-        # Limite de segurança: se uma coluna tiver mais que 500 valores únicos, 
-        # talvez não seja útil como filtro de checkbox (ex: ID, observação livre)
-        LIMITE_UNICOS = 1000 
-
-        for col in df.columns:
-            # Pega valores únicos, converte para string, remove nulos e vazios
-            unicos = df[col].dropna().astype(str).unique()
-            unicos = [x for x in unicos if x.strip() != ""]
-            
-            if len(unicos) <= LIMITE_UNICOS:
-                opcoes[col] = sorted(unicos)
-            else:
-                # Se tiver muitos valores, não mandamos a lista (o front deve usar busca texto livre)
-                opcoes[col] = []
+        dataset = get_dataset("geral")
+        if dataset.vazio:
+            return jsonify({})
+
+        # Valores distintos vêm do catálogo da versão (colunas com mais de
+        # LIMITE_VALORES valores voltam vazias: o front usa a busca livre)
+        cat = catalogo(dataset)
+        opcoes = {col: cat.opcoes(col) for col in cat.posicoes}
 
         # Retornamos também o mapa de nomes para compatibilidade, 
         # mas agora a chave é o próprio nome da coluna
         final_response = opcoes.copy()
-        for col in df.columns:
+        for col in cat.posicoes:
             final_response[f"{col}_col_name"] = col
 
         return jsonify(final_response)
 
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
+
+
+def _opcoes_filtro(dataset, colunas):
+    """Opções dos filtros da tela: colunas com 2 a 99 valores distintos (catálogo da versão)."""
+    LIMITE_OPCOES = 100
+    cat = catalogo(dataset)
+
+    filtros_disponiveis = {}
+    for col in colunas:
+        opcoes = cat.opcoes_tela(col, LIMITE_OPCOES)
+        if opcoes is not None:
+            filtros_disponiveis[col] = opcoes
+    return filtros_disponiveis
+
 # -----------------------------
 # 5. API VISA (/api/visa) - COM FILTROS DINÂMICOS
 # -----------------------------
 @api_bp.route("/visa")
-@cache.cached(timeout=10, query_string=True)
+@cache_consulta("visa")
 def api_visa():
     try:
-        df = load_visa_dataframe()
+        dataset = get_dataset("visa")
+        df = dataset.df
         
         if df.empty:
             return jsonify({"dados": [], "colunas": [], "opcoes_filtro": {}})
 
-        # 1. Aplica Filtros (inclui busca 'q' e filtros de coluna)
-        df_filtrado = apply_filters(df, request.args)
-            
-        data_json = df_filtrado.to_dict(orient="records")
-        colunas = list(df.columns)
+        # 1. Aplica Filtros (inclui busca 'q' e filtros de coluna) e paginação
+        resultado = consultar(dataset, request.args)
+        # Colunas da resposta (todas as públicas, ou as pedidas em fields=)
+        colunas = resultado.colunas
         
-        # 2. Gera Opções de Filtro
-        filtros_disponiveis = {}
-        LIMITE_OPCOES = 100 
-        
-        for col in colunas:
-            unicos = sorted(list(set(df[col].astype(str).dropna().unique())))
-            if 1 < len(unicos) < LIMITE_OPCOES: 
-                filtros_disponiveis[col] = [x for x in unicos if x.strip() != ""]
+        # 2. Gera Opções de Filtro (catálogo da versão da planilha)
+        filtros_disponiveis = _opcoes_filtro(dataset, colunas)
 
-        return jsonify({
-            "dados": data_json, 
+        resposta = {
             "colunas": colunas,
             "opcoes_filtro": filtros_disponiveis
-        })
+        }
+        if resultado.paginacao:
+            resposta["total_registros"] = resultado.total
+            resposta["paginacao"] = resultado.paginacao
+        return responder_tabela(resultado, "nativo", resposta)
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -120,37 +158,133 @@ def api_visa():
 # 6. API HACCP (/api/haccp) - COM FILTROS DINÂMICOS
 # -----------------------------
 @api_bp.route("/haccp")
-@cache.cached(timeout=10, query_string=True)
+@cache_consulta("haccp")
 def api_haccp():
     try:
-        df = load_haccp_dataframe()
+        dataset = get_dataset("haccp")
+        df = dataset.df
         
         if df.empty:
             return jsonify({"dados": [], "colunas": [], "opcoes_filtro": {}})
 
-        # 1. Aplica Filtros
-        df_filtrado = apply_filters(df, request.args)
-
-        data_json = df_filtrado.to_dict(orient="records")
-        colunas = list(df.columns)
+        # 1. Aplica Filtros e paginação
+        resultado = consultar(dataset, request.args)
+        # Colunas da resposta (todas as públicas, ou as pedidas em fields=)
+        colunas = resultado.colunas
 
-        # 2. Gera Opções de Filtro
-        filtros_disponiveis = {}
-        LIMITE_OPCOES = 100
+        # 2. Gera Opções de Filtro (catálogo da versão da planilha)
+        filtros_disponiveis = _opcoes_filtro(dataset, colunas)
 
-        for col in colunas:
-            unicos = sorted(list(set(df[col].astype(str).dropna().unique())))
-            if 1 < len(unicos) < LIMITE_OPCOES:
-                filtros_disponiveis[col] = [x for x in unicos if x.strip() != ""]
-
-        return jsonify({
-            "dados": data_json, 
+        resposta = {
             "colunas": colunas,
             "opcoes_filtro": filtros_disponiveis
-        })
+        }
+        if resultado.paginacao:
+            resposta["total_registros"] = resultado.total
+            resposta["paginacao"] = resultado.paginacao
+        return responder_tabela(resultado, "nativo", resposta)
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# -----------------------------
+# 6.1 FACETAS (/api/<dataset>/facets) - CONTAGENS DOS FILTROS EM CASCATA
+# -----------------------------
+@api_bp.route("/<nome>/facets")
+@cache_consulta()
+def api_facetas(nome):
+    """
+    Valores e contagens de cada coluna (fields=) sob os demais filtros ativos.
+    Ex: /api/geral/facets?fields=regional,mes&regional=SAO1&q=gm
+    """
+    if nome not in ("geral", "visa", "haccp"):
+        return jsonify({"erro": f"Dataset desconhecido: {nome}"}), 404
+    try:
+        dataset = get_dataset(nome)
+        if dataset.vazio:
+            return jsonify({"total": 0, "facetas": {}})
+
+        nomes = list(dataset.df.columns)
+        colunas = list(dict.fromkeys(nomes[i] for i in ler_projecao(request.args, dataset.df)))
+        return jsonify(calcular_facetas(dataset, request.args, colunas))
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# -----------------------------
+# 6.2 CATÁLOGO (/api/<dataset>/catalog) - ESTATÍSTICAS DAS COLUNAS
+# -----------------------------
+@api_bp.route("/<nome>/catalog")
+@cache_consulta()
+def api_catalogo(nome):
+    """Tipo, nulos/vazios, distintos, mínimo/máximo e valores mais frequentes de cada coluna."""
+    if nome not in ("geral", "visa", "haccp"):
+        return jsonify({"erro": f"Dataset desconhecido: {nome}"}), 404
+    try:
+        dataset = get_dataset(nome)
+        resposta = {"dataset": nome, "fingerprint": (dataset.fingerprint or "")[:20], "linhas": 0, "colunas": {}}
+        if not dataset.vazio:
+            resposta.update(catalogo(dataset).to_dict())
+        return jsonify(resposta)
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# -----------------------------
+# 6.3 AGREGAÇÕES (/api/<dataset>/aggregate) - GROUP BY GENÉRICO
+# -----------------------------
+@api_bp.route("/<nome>/aggregate")
+@cache_consulta()
+def api_agregacao(nome):
+    """
+    Contagens/somas/médias/proporções por grupo, sob os filtros do request.
+    Ex: /api/geral/aggregate?group_by=regional,_mes&metric=count,ratio:back_room=ok
+    """
+    if nome not in ("geral", "visa", "haccp"):
+        return jsonify({"erro": f"Dataset desconhecido: {nome}"}), 404
+    try:
+        dataset = get_dataset(nome)
+        if dataset.vazio:
+            return jsonify({"group_by": [], "metricas": [], "total": 0, "grupos": [], "truncado": False})
+        return jsonify(agregar(dataset, request.args))
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# -----------------------------
+# 6.4 EXPORTAÇÃO (/api/<dataset>/export) - ARROW / PARQUET / CSV / XLSX DA VISÃO FILTRADA
+# -----------------------------
+@api_bp.route("/<nome>/export")
+@cache_consulta()
+def api_exportacao(nome):
+    """
+    Tabela filtrada, limpa e tipada, em arrow, parquet, csv ou xlsx.
+    Ex: /api/geral/export?format=parquet&regional=SAO1&fields=codigo,data_coleta
+    """
+    if nome not in ("geral", "visa", "haccp"):
+        return jsonify({"erro": f"Dataset desconhecido: {nome}"}), 404
+    try:
+        formato = ler_formato_exportacao(request.args)
+        resultado, corpo = exportar(get_dataset(nome), request.args, formato)
+    except ParametroInvalido as e:
+        return jsonify({"erro": str(e)}), 400
+    except ImportError:
+        return jsonify({"erro": f"Exportação {formato} indisponível: dependência não instalada."}), 501
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+    mimetype, extensao = FORMATOS_EXPORTACAO[formato]
+    cabecalhos = {
+        "Content-Disposition": f'attachment; filename="{nome}.{extensao}"',
+        "X-Total-Registros": str(resultado.total),
+        "X-Accel-Buffering": "no",
+    }
+    if resultado.paginacao and resultado.paginacao.get("proximo_cursor"):
+        cabecalhos["X-Proximo-Cursor"] = resultado.paginacao["proximo_cursor"]
+    return current_app.response_class(stream_with_context(corpo), mimetype=mimetype, headers=cabecalhos)
+
 # -----------------------------
 # 7. STATUS DOS ARQUIVOS (NOVO)
 # -----------------------------
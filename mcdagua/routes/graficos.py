@@ -1,25 +1,8 @@
-import pandas as pd
 import os
 from flask import Blueprint, jsonify, current_app
-from mcdagua.core.loader import load_geral_dataframe, load_haccp_graphics_data
-from mcdagua.services.excel_processor import (
-    ler_range_exato, 
-    processar_evolucao_anual_anos, # NOVA FUNÇÃO
-    processar_pendencias_regional_meses, # NOVO FORMATO
-    processar_regional_ok_nok,     # RENOMEADA para clareza
-    processar_status_bloco, 
-    processar_pendencias_top,
-    processar_aba_geral,
-    processar_backroom_mensal,       # Back Room OK/NOK mensal
-    processar_backroom_por_regional, # Back Room por Regional
-    processar_gelopool_mensal,       # Gelo Pool OK/NOK mensal
-    processar_gelopool_por_regional  # Gelo Pool por Regional
-)
-from mcdagua.services.kpis import (
-    get_programado_realizado, 
-    get_tipo_coleta_por_mes, 
-    get_nao_conformidade_por_gerente
-)
+from mcdagua.core.compressao import responder_bytes
+from mcdagua.core.payloads import obter_payload
+from mcdagua.services.dashboards import montar_graficos_data, montar_haccp_graficos
 
 graficos_bp = Blueprint("graficos", __name__)
 
@@ -30,83 +13,16 @@ def get_safe_path():
     if os.path.exists(path_docker): return path_docker
     return None
 
+def responder_payload(payload):
+    """JSON materializado com ETag forte (304 se o cliente já tem a versão), comprimido."""
+    return responder_bytes(payload.corpo, "application/json", payload.etag, payload.codificados)
+
 @graficos_bp.route("/api/graficos-data")
 def graficos_data():
     try:
-        print("\n🚀 [API] Lendo gráficos dos intervalos fixos...")
-        response_data = {}
         path = get_safe_path()
         if not path: return jsonify({"erro": "Planilha não encontrada"}), 500
-
-        ABA = "Gráfico pendencia"
-
-        # 1. EVOLUÇÃO ANUAL (K3:N15) -> AGORA LÊ ANOS (2023, 2024...)
-        print(f"📂 Lendo Anual: {ABA} K3:O15")
-        df_anual = ler_range_exato(path, ABA, "3:15", usecols="K:O")
-        # Usa a função nova que entende colunas de anos
-        response_data["restaurante_anual"] = processar_evolucao_anual_anos(df_anual)
-
-        # 2. PENDÊNCIAS POR REGIONAL (K20:O32) -> Novo Formato
-        print(f"📂 Lendo Regional: {ABA} K20:O32")
-        df_regional = ler_range_exato(path, ABA, "20:32", usecols="K:O")
-        response_data["restaurante_regional"] = processar_pendencias_regional_meses(df_regional)
-
-        # 3. BACK ROOM STATUS (K38:O42)
-        print(f"📂 Lendo Back Room: {ABA} K38:O42")
-        df_back = ler_range_exato(path, ABA, "38:42", usecols="K:O")
-        response_data["backroom"] = processar_status_bloco(df_back)
-
-        # 4. GELO STATUS (K50:O54)
-        print(f"📂 Lendo Gelo Status: {ABA} K50:O54")
-        df_gelo = ler_range_exato(path, ABA, "50:54", usecols="K:O")
-        response_data["gelo"] = processar_status_bloco(df_gelo)
-
-        # 5. PENDÊNCIAS GELO (K65:N69)
-        print(f"📂 Lendo Pendências Gelo: {ABA} K65:N69")
-        df_pend = ler_range_exato(path, ABA, "65:69", usecols="K:N")
-        response_data["pendencias_gelo"] = processar_pendencias_top(df_pend)
-
-        # Extras (dados da aba GERAL)
-        df_geral = load_geral_dataframe()
-        response_data["programado_realizado"] = get_programado_realizado(df_geral)
-        response_data["tipo_coleta"] = get_tipo_coleta_por_mes(df_geral)
-        response_data["nao_conformidade_gm"] = get_nao_conformidade_por_gerente(df_geral)
-        
-        # NOVO: Back Room conformidade mensal (coluna I)
-        try:
-            response_data["backroom_mensal"] = processar_backroom_mensal(path)
-        except Exception as e:
-            print(f"⚠️ [BACKROOM MENSAL] Erro: {e}")
-            response_data["backroom_mensal"] = {"labels": [], "ok": [], "nok": [], "ok_pct": [], "nok_pct": []}
-        
-        # NOVO: Back Room conformidade por Regional
-        try:
-            response_data["backroom_regional"] = processar_backroom_por_regional(path)
-        except Exception as e:
-            print(f"⚠️ [BACKROOM REGIONAL] Erro: {e}")
-            response_data["backroom_regional"] = {"meses": [], "regionais": [], "dados": {}}
-        
-        # NOVO: Gelo Pool conformidade mensal (coluna S)
-        try:
-            response_data["gelopool_mensal"] = processar_gelopool_mensal(path)
-        except Exception as e:
-            print(f"⚠️ [GELO POOL MENSAL] Erro: {e}")
-            response_data["gelopool_mensal"] = {"labels": [], "ok": [], "nok": [], "ok_pct": [], "nok_pct": []}
-        
-        # NOVO: Gelo Pool conformidade por Regional
-        try:
-            response_data["gelopool_regional"] = processar_gelopool_por_regional(path)
-        except Exception as e:
-            print(f"⚠️ [GELO POOL REGIONAL] Erro: {e}")
-            response_data["gelopool_regional"] = {"meses": [], "regionais": [], "dados": {}}
-        
-        try:
-            dados_geral, _ = processar_aba_geral(path)
-            if dados_geral and "detalhes_parametros" in dados_geral:
-                response_data["detalhes_parametros"] = dados_geral["detalhes_parametros"]
-        except: pass
-
-        return jsonify(response_data)
+        return responder_payload(obter_payload("graficos-data", path, montar_graficos_data))
     except Exception as e:
         print(f"❌ [CRÍTICO] Erro: {e}")
         import traceback
@@ -116,10 +32,7 @@ def graficos_data():
 @graficos_bp.route("/api/haccp-graficos")
 def haccp_graficos():
     try:
-        data = load_haccp_graphics_data()
-        response_data = {}
-        for cat, val in data.items():
-            response_data[cat] = {"labels": list(val.keys()), "values": list(val.values())} if val else {"labels": [], "values": []}
-        return jsonify(response_data)
+        path = current_app.config.get("PATH_HACCP")
+        return responder_payload(obter_payload("haccp-graficos", path, montar_haccp_graficos))
     except Exception as e:
-        return jsonify({"erro": str(e)}), 500
\ No newline at end of file
+        return jsonify({"erro": str(e)}), 500
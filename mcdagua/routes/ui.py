@@ -3,6 +3,7 @@ from flask import Blueprint, render_template, request
 from mcdagua.core.loader import load_geral_dataframe as get_dataframe
 from mcdagua.services.filters import apply_filters
 from mcdagua.services.kpis import calculate_kpis
+from mcdagua.core.datas import sem_derivadas
 from mcdagua.auth.basic import require_auth
 
 ui_bp = Blueprint("ui", __name__)
@@ -16,8 +17,8 @@ def dashboard():
 
     return render_template(
         "dashboard.html",
-        df=filtered.to_dict(orient="records"),
-        columns=filtered.columns,
+        df=sem_derivadas(filtered).to_dict(orient="records"),
+        columns=sem_derivadas(filtered).columns,
         kpis=kpis,
         args=request.args
     )
\ No newline at end of file
@@ -3,9 +3,7 @@ import shutil
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt
-from mcdagua.core.loader import refresh_dataframe
-# Importa o serviço que criamos para processar os dados estatísticos
-from mcdagua.services.excel_processor import processar_aba_geral
+from mcdagua.tasks.ingestao import enfileirar_ingestao, obter_job
 
 upload_bp = Blueprint("upload", __name__)
 
@@ -66,38 +64,37 @@ def upload_file(tipo_arquivo):
         return jsonify({"msg": f"Caminho não configurado para {tipo_arquivo}."}), 500
 
     try:
-        # 1. Preparação e Backup
+        # Só grava o arquivo recebido e enfileira: leitura, validação, backup,
+        # publicação e pré-cálculo rodam em segundo plano (ver tasks/ingestao.py)
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        realizar_backup(save_path)
-        
-        # 2. Salvar o arquivo
-        file.save(save_path)
-        
-        # 3. Atualizar DataFrames globais
-        refresh_dataframe()
-        
-        # 4. Processamento Específico (Novidade aqui)
-        response_data = {"msg": f"Upload de {tipo_arquivo} realizado com sucesso!"}
-
-        if tipo_arquivo == "geral":
-            print(f"⚙️ [PROCESSAMENTO] Iniciando análise estatística da aba GERAL...")
-            dados_dashboard, erro = processar_aba_geral(save_path)
-            
-            if erro:
-                print(f"⚠️ [PROCESSAMENTO] Aviso: {erro}")
-                # Adiciona aviso na resposta, mas não falha o upload (arquivo já foi salvo)
-                response_data["warning"] = f"Arquivo salvo, mas houve erro ao gerar gráficos: {erro}"
-            else:
-                print("✅ [PROCESSAMENTO] Dados estatísticos gerados com sucesso.")
-                # Anexa os dados processados ao JSON de resposta
-                response_data["dashboard_data"] = dados_dashboard
+        job = enfileirar_ingestao(current_app._get_current_object(), tipo_arquivo, file, save_path)
 
-        return jsonify(response_data), 200
+        return jsonify({
+            "msg": f"Upload de {tipo_arquivo} recebido. Processando em segundo plano.",
+            "job_id": job.id,
+            "status": job.dados["status"],
+            "status_url": f"/api/ingest-jobs/{job.id}"
+        }), 202
 
     except Exception as e:
         print(f"❌ Erro no upload: {e}")
         return jsonify({"msg": f"Erro interno: {str(e)}"}), 500
 
+# --- ACOMPANHAMENTO DA INGESTÃO ---
+@upload_bp.route("/api/ingest-jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def ingest_job_status(job_id):
+    """Etapa atual, progresso, tempos por etapa e erro de um job de upload."""
+    for config_key in ("PATH_GERAL", "PATH_VISA", "PATH_HACCP"):
+        path = current_app.config.get(config_key)
+        if not path:
+            continue
+        job = obter_job(path, job_id, current_app.config.get("INGEST_JOB_TIMEOUT_MINUTES", 30))
+        if job:
+            return jsonify(job), 200
+
+    return jsonify({"msg": "Job não encontrado."}), 404
+
 # --- ROTA DE DOWNLOAD ---
 @upload_bp.route("/download/<tipo_arquivo>", methods=["GET"])
 @jwt_required()
@@ -142,7 +139,7 @@ def download_file(tipo_arquivo):
             as_attachment=True,
             download_name=mapa_nomes[tipo_arquivo],
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            conditional=False,
+            conditional=True,   # ETag/Last-Modified: planilha igual responde 304
             max_age=0
         )
     except Exception as e:
@@ -0,0 +1,205 @@
+import threading
+import numpy as np
+import pandas as pd
+from werkzeug.http import http_date
+from mcdagua.core.datas import colunas_publicas
+from mcdagua.services.busca import dobrar_texto
+from mcdagua.services.expressoes import ParametroInvalido
+from mcdagua.services.filters import _valores_filtro, chave_filtros, filtrar_linhas, indice_filtros
+
+# ==============================================================================
+# AGREGAÇÕES GENÉRICAS (/api/<dataset>/aggregate)
+# ==============================================================================
+# Cada gráfico novo virava uma função em kpis.py/excel_processor.py que copiava
+# o DataFrame e fazia loops. Aqui o front monta o gráfico pela URL:
+#
+#   /api/geral/aggregate?group_by=regional,_mes&metric=count,ratio:back_room=ok
+#                        &data_coleta>=2026-01-01
+#
+# group_by: colunas separadas por vírgula (as da planilha e as derivadas _ano
+#           e _mes); vazio = um grupo só com todas as linhas.
+# metric:   count                 linhas do grupo
+#           sum:col / avg:col     soma / média (coluna numérica)
+#           min:col / max:col     menor / maior valor (número ou data)
+#           distinct:col          valores distintos preenchidos
+#           ratio:col=valor       fração das linhas com col = valor (sem
+#                                 maiúsculas, lista com "|": ratio:status=ok|na)
+# Demais parâmetros são os filtros de sempre (q, col=valor, expressões).
+# Datas (min/max de colunas de data) saem como nas telas: http_date.
+#
+# Os filtros usam os bitmaps da versão, as métricas saem dos vetores tipados e
+# tudo vira um único groupby do pandas sobre as linhas selecionadas. O resultado
+# fica em cache por versão do dataset + consulta normalizada.
+
+METRICAS = ("count", "sum", "avg", "min", "max", "distinct", "ratio")
+
+# Derivadas que podem ser usadas no group_by
+DERIVADAS_AGRUPAMENTO = ("_ano", "_mes")
+
+# Acima disso a resposta vem cortada (truncado = true)
+LIMITE_GRUPOS = 5000
+
+# Resultados guardados por versão do dataset
+LIMITE_CACHE = 256
+
+
+def _lista(texto):
+    return [p.strip() for p in (texto or "").split(",") if p.strip()]
+
+
+def ler_agrupamento(args, df):
+    permitidas = set(colunas_publicas(df)) | {c for c in DERIVADAS_AGRUPAMENTO if c in df.columns}
+    grupos = tuple(dict.fromkeys(_lista(args.get("group_by"))))
+    desconhecidas = [c for c in grupos if c not in permitidas]
+    if desconhecidas:
+        raise ParametroInvalido(f"Coluna(s) de agrupamento desconhecida(s): {', '.join(desconhecidas)}")
+    return grupos
+
+
+def ler_metricas(args, colunas):
+    """'count,ratio:status=OK|na' -> (('count', None, None), ('ratio', 'status', ('na', 'ok')))."""
+    metricas = []
+    for texto in _lista(args.get("metric")) or ["count"]:
+        nome, _, resto = texto.partition(":")
+        nome = nome.strip().lower()
+        if nome not in METRICAS:
+            raise ParametroInvalido(f"Métrica desconhecida: {texto} (use {', '.join(METRICAS)}).")
+        if nome == "count":
+            metricas.append((nome, None, None))
+            continue
+
+        coluna, valor = resto, None
+        if nome == "ratio":
+            coluna, igual, valor = resto.partition("=")
+            if not igual or not valor:
+                raise ParametroInvalido(f"Use ratio:coluna=valor ({texto}).")
+            valor = tuple(sorted(set(_valores_filtro(valor))))
+        coluna = coluna.strip()
+        if coluna not in colunas:
+            raise ParametroInvalido(f"Coluna desconhecida na métrica {texto}.")
+        metricas.append((nome, coluna, valor))
+    return tuple(dict.fromkeys(metricas))
+
+
+def nome_metrica(metrica):
+    nome, coluna, valor = metrica
+    if nome == "count":
+        return nome
+    if nome == "ratio":
+        return f"ratio:{coluna}={'|'.join(valor)}"
+    return f"{nome}:{coluna}"
+
+
+class IndiceAgregacoes:
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def guardar(self, chave, resultado):
+        with self._lock:
+            if len(self._cache) >= LIMITE_CACHE:
+                self._cache.clear()
+            self._cache[chave] = resultado
+
+
+def indice_agregacoes(dataset):
+    return dataset.memo("indice_agregacoes", IndiceAgregacoes)
+
+
+def _chave_grupo(serie):
+    """Valores do agrupamento como aparecem no JSON (texto, ou inteiro em _ano/_mes)."""
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie
+    return serie.astype(str)
+
+
+def _vetor_metrica(dataset, metrica, linhas):
+    nome, coluna, valor = metrica
+    indice = indice_filtros(dataset)
+
+    if nome == "ratio":
+        bitmap = indice.mascara(coluna, valor)
+        return np.unpackbits(bitmap, count=len(dataset.df)).astype(float)[linhas]
+    if nome == "distinct":
+        serie = dataset.df[coluna].iloc[linhas].astype(str)
+        return serie.where(serie.str.strip() != "").to_numpy()
+
+    tipada = indice.tipada(coluna)
+    if tipada.tipo == "texto" or (tipada.tipo == "data" and nome in ("sum", "avg")):
+        raise ParametroInvalido(f"{nome}:{coluna} precisa de uma coluna numérica.")
+    return tipada.valores[linhas]
+
+
+def agregar(dataset, args):
+    """{"group_by", "metricas", "total", "grupos": [{col..., métrica...}], "truncado"}."""
+    df = dataset.df
+    grupos = ler_agrupamento(args, df)
+    metricas = ler_metricas(args, df.columns)
+
+    indice = indice_agregacoes(dataset)
+    chave = (grupos, metricas, dobrar_texto(args.get("q", "")), chave_filtros(args, df.columns))
+    em_cache = indice._cache.get(chave)
+    if em_cache is not None:
+        return em_cache
+
+    linhas = filtrar_linhas(df, args, dataset)
+    if linhas is None:
+        linhas = np.arange(len(df))
+
+    # Um DataFrame enxuto (só chaves e métricas das linhas selecionadas) e um groupby
+    colunas = {f"g{i}": _chave_grupo(df[c].iloc[linhas]).to_numpy() for i, c in enumerate(grupos)}
+    agregacoes = {}
+    for i, metrica in enumerate(metricas):
+        nome = metrica[0]
+        if nome == "count":
+            agregacoes[nome_metrica(metrica)] = ("_linha", "size")
+            continue
+        colunas[f"m{i}"] = _vetor_metrica(dataset, metrica, linhas)
+        funcao = {"avg": "mean", "ratio": "mean", "distinct": "nunique"}.get(nome, nome)
+        agregacoes[nome_metrica(metrica)] = (f"m{i}", funcao)
+    colunas["_linha"] = np.ones(len(linhas), dtype=np.int8)
+    tabela = pd.DataFrame(colunas)
+
+    if grupos:
+        resultado = tabela.groupby([f"g{i}" for i in range(len(grupos))], sort=True).agg(**agregacoes)
+        resultado.index.names = list(grupos)
+        resultado = resultado.reset_index()
+    else:
+        resultado = _linha_unica(tabela, agregacoes)
+
+    truncado = len(resultado) > LIMITE_GRUPOS
+    resposta = {
+        "group_by": list(grupos),
+        "metricas": [nome_metrica(m) for m in metricas],
+        "total": int(len(linhas)),
+        "grupos": _registros(resultado.head(LIMITE_GRUPOS)),
+        "truncado": truncado,
+    }
+    indice.guardar(chave, resposta)
+    return resposta
+
+
+def _linha_unica(tabela, agregacoes):
+    """Agregação sem group_by: um grupo com todas as linhas selecionadas."""
+    linha = {}
+    for nome, (coluna, funcao) in agregacoes.items():
+        serie = tabela[coluna]
+        linha[nome] = len(serie) if funcao == "size" else getattr(serie, funcao)()
+    return pd.DataFrame([linha])
+
+
+def _registros(resultado):
+    """Linhas do resultado como dicts JSON (NaN/NaT -> None, datas em http_date)."""
+    registros = []
+    for registro in resultado.to_dict(orient="records"):
+        for chave, valor in registro.items():
+            if isinstance(valor, pd.Timestamp):
+                registro[chave] = http_date(valor.to_pydatetime())
+            elif isinstance(valor, np.generic):
+                registro[chave] = valor.item()
+            if isinstance(registro[chave], float) and np.isnan(registro[chave]):
+                registro[chave] = None
+            elif registro[chave] is pd.NaT:
+                registro[chave] = None
+        registros.append(registro)
+    return registros
@@ -0,0 +1,133 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from mcdagua.core.datas import PREFIXO_DERIVADA
+
+# ==============================================================================
+# ÍNDICE INVERTIDO PARA A BUSCA LIVRE (?q=)
+# ==============================================================================
+# A busca das telas Geral/VISA/HACCP convertia o DataFrame inteiro em texto
+# (out.astype(str)) e rodava str.contains em todas as colunas a cada tecla.
+# Agora, uma vez por versão do dataset, montamos:
+#   - o texto de cada linha (colunas separadas por \x1f), em minúsculas e sem
+#     acentos, usado para confirmar a busca por substring;
+#   - um índice token -> linhas, onde token é cada sequência de letras/dígitos.
+#
+# Uma busca por "suco" encontra os tokens do vocabulário que contêm "suco"
+# (o vocabulário é muito menor que a planilha) e une as linhas deles. Buscas
+# com vários termos ("gm 1") intersectam as linhas de cada termo e confirmam a
+# substring só nas candidatas. Buscas sem letras/dígitos (ex: "-") varrem o
+# texto pré-calculado, como antes.
+
+SEPARADOR = "\x1f"
+TOKEN = re.compile(r"\w+")
+
+# Termos memorizados por índice (digitação incremental reaproveita o anterior)
+LIMITE_TERMOS_MEMO = 2048
+
+
+def dobrar_texto(texto):
+    """Minúsculas e sem acentos: 'Março' -> 'marco'."""
+    decomposto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _coluna_dobrada(serie):
+    # Cada valor distinto é dobrado uma vez (colunas category já têm os únicos)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = np.array([dobrar_texto(c) for c in serie.cat.categories.astype(str)], dtype=object)
+        codigos = serie.cat.codes.to_numpy()
+        valores = categorias.take(codigos) if len(categorias) else np.full(len(serie), "", dtype=object)
+        valores[codigos < 0] = "nan"
+        return pd.Series(valores, index=serie.index)
+    texto = serie.astype(str)
+    unicos = {v: dobrar_texto(v) for v in pd.unique(texto)}
+    return texto.map(unicos)
+
+
+def textos_linhas(df):
+    """Texto pesquisável de cada linha (colunas públicas, dobradas, separadas por \\x1f)."""
+    # Por posição: a planilha pode ter nomes de coluna repetidos
+    posicoes = [i for i, c in enumerate(df.columns) if not str(c).startswith(PREFIXO_DERIVADA)]
+    if not posicoes or df.empty:
+        return pd.Series("", index=df.index, dtype=object)
+    partes = [_coluna_dobrada(df.iloc[:, i]) for i in posicoes]
+    return partes[0].str.cat(partes[1:], sep=SEPARADOR) if len(partes) > 1 else partes[0]
+
+
+def mascara_busca(df, q):
+    """Busca sem índice (substring sem acento em qualquer coluna)."""
+    return textos_linhas(df).str.contains(dobrar_texto(q), regex=False).to_numpy()
+
+
+class IndiceBusca:
+    def __init__(self, df):
+        self.total = len(df)
+        self.textos = textos_linhas(df).to_numpy(dtype=object)
+
+        postings = {}
+        for linha, texto in enumerate(self.textos):
+            for token in set(TOKEN.findall(texto)):
+                postings.setdefault(token, []).append(linha)
+
+        self.vocabulario = list(postings)
+        self.linhas_token = [np.asarray(postings[t], dtype=np.int32) for t in self.vocabulario]
+        self._termos = {}
+
+    def _termo(self, termo):
+        """(tokens do vocabulário que contêm `termo`, linhas desses tokens)."""
+        memo = self._termos.get(termo)
+        if memo is not None:
+            return memo
+
+        # Quem contém "suco" também contém "suc": parte do maior prefixo já buscado
+        candidatos = None
+        for fim in range(len(termo) - 1, 0, -1):
+            anterior = self._termos.get(termo[:fim])
+            if anterior is not None:
+                candidatos = anterior[0]
+                break
+        if candidatos is None:
+            candidatos = range(len(self.vocabulario))
+
+        tokens = [i for i in candidatos if termo in self.vocabulario[i]]
+        memo = (tokens, self._unir([self.linhas_token[i] for i in tokens]))
+        if len(self._termos) >= LIMITE_TERMOS_MEMO:
+            self._termos.clear()
+        self._termos[termo] = memo
+        return memo
+
+    @staticmethod
+    def _unir(listas):
+        if not listas:
+            return np.empty(0, dtype=np.int32)
+        if len(listas) == 1:
+            return listas[0]
+        return np.unique(np.concatenate(listas))
+
+    def buscar(self, q):
+        """Posições (ordenadas) das linhas que contêm `q`."""
+        alvo = dobrar_texto(q)
+        if SEPARADOR in alvo:
+            return np.empty(0, dtype=np.int32)
+        termos = TOKEN.findall(alvo)
+        if not termos:
+            return np.flatnonzero([alvo in t for t in self.textos]).astype(np.int32)
+
+        linhas = None
+        for termo in sorted(set(termos), key=len, reverse=True):
+            atuais = self._termo(termo)[1]
+            linhas = atuais if linhas is None else np.intersect1d(linhas, atuais, assume_unique=True)
+            if not len(linhas):
+                return linhas
+
+        # Um termo só, sem espaços/pontuação: estar num token já é a substring
+        if len(termos) == 1 and termos[0] == alvo:
+            return linhas
+        return linhas[[alvo in self.textos[i] for i in linhas]]
+
+
+def indice_busca(dataset):
+    """Índice da versão atual do dataset (montado no primeiro ?q=)."""
+    return dataset.memo("indice_busca", lambda: IndiceBusca(dataset.df))
@@ -0,0 +1,222 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from mcdagua.core.compressao import nao_modificado, responder_bytes, resposta_304
+from mcdagua.services.busca import dobrar_texto
+from mcdagua.services.expressoes import ParametroInvalido
+from mcdagua.services.filters import PARAMETROS_CONTROLE, chave_filtros
+
+# ==============================================================================
+# CACHE DAS CONSULTAS (/api/geral, /api/visa, /api/haccp e /api/<dataset>/...)
+# ==============================================================================
+# O @cache.cached(timeout=10, query_string=True) usava a query string crua como
+# chave: "regional=SP&mes=Janeiro" e "mes=janeiro&regional=sp" eram entradas
+# diferentes, tudo expirava em 10s mesmo sem upload e o refresh agendado
+# (cache.clear()) apagava o resto.
+#
+# Aqui a chave é a consulta normalizada + a versão do dataset:
+#   - filtros de coluna em ordem alfabética, valores em minúsculas e listas
+#     "SP|RJ" ordenadas e sem repetição (o resultado é o mesmo);
+#   - busca livre sem maiúsculas/acentos, como o índice de busca compara;
+#   - expressões (data>=..., status!=...) já interpretadas, datas relativas
+#     (hoje-30d) resolvidas;
+#   - parâmetros vazios, colunas inexistentes e o "_" (anti-cache) ignorados.
+# As respostas prontas (bytes) ficam num LRU limitado por tamanho total
+# (QUERY_CACHE_MAX_BYTES), junto com as versões comprimidas (gzip/brotli)
+# geradas sob demanda. Quando a versão de um dataset muda, só as entradas dele
+# são descartadas; as dos outros continuam valendo.
+#
+# ETag: hash de (impressão digital do conteúdo, rota, consulta normalizada),
+# igual em todos os workers. Um If-None-Match que bate responde 304 antes de
+# rodar filtros ou montar o corpo, inclusive nas respostas em streaming.
+
+# Orçamento padrão por worker
+LIMITE_BYTES_PADRAO = 64 * 1024 * 1024
+
+# Uma resposta maior que esta fração do orçamento não é guardada
+FRACAO_MAXIMA_ENTRADA = 4
+
+# Parâmetros de controle que não mudam a resposta
+PARAMETROS_IGNORADOS = {"_"}
+
+
+def chave_consulta(args, colunas):
+    """
+    Forma canônica dos parâmetros do request (tupla ordenada, hashável).
+    `colunas`: colunas do dataset; filtros por colunas inexistentes não
+    alteram o resultado e ficam fora da chave.
+    """
+    controles = []
+    for chave, valor in args.items():
+        if not valor or chave in PARAMETROS_IGNORADOS or chave == "filter":
+            continue
+        if chave == "q":
+            controles.append((chave, dobrar_texto(valor)))
+        elif chave in PARAMETROS_CONTROLE:
+            controles.append((chave, valor))
+    return tuple(sorted(controles)), chave_filtros(args, colunas)
+
+
+class RespostaGuardada:
+    def __init__(self, corpo, mimetype, etag):
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.etag = etag
+        self.codificados = {}   # "gzip"/"br" -> corpo comprimido
+
+    @property
+    def tamanho(self):
+        return len(self.corpo) + sum(len(c) for c in self.codificados.values())
+
+
+class CacheConsultas:
+    """LRU de respostas prontas, limitado pelo total de bytes guardados."""
+
+    def __init__(self, limite_bytes=LIMITE_BYTES_PADRAO):
+        self.limite_bytes = limite_bytes
+        self.bytes = 0
+        self._entradas = OrderedDict()   # (dataset, versão, rota, consulta) -> RespostaGuardada
+        self._tamanhos = {}              # chave -> bytes contabilizados
+        self._versoes = {}               # dataset -> última versão vista
+        self._lock = threading.Lock()
+
+    def _remover(self, chave):
+        self._entradas.pop(chave)
+        self.bytes -= self._tamanhos.pop(chave)
+
+    def _descartar_dataset(self, nome):
+        for chave in [c for c in self._entradas if c[0] == nome]:
+            self._remover(chave)
+
+    def _conferir_versao(self, nome, versao):
+        """
+        Chamado com o lock. Versão nova do dataset descarta as respostas antigas
+        dele; False se `versao` já foi superada (request lento da versão anterior).
+        """
+        vista = self._versoes.get(nome)
+        if vista is not None and versao < vista:
+            return False
+        if vista != versao:
+            self._descartar_dataset(nome)
+            self._versoes[nome] = versao
+        return True
+
+    def obter(self, chave):
+        with self._lock:
+            if not self._conferir_versao(chave[0], chave[1]):
+                return None
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+            return entrada
+
+    def _liberar_espaco(self):
+        while self.bytes > self.limite_bytes and self._entradas:
+            self._remover(next(iter(self._entradas)))
+
+    def guardar(self, chave, entrada):
+        if entrada.tamanho > self.limite_bytes // FRACAO_MAXIMA_ENTRADA:
+            return
+        with self._lock:
+            if not self._conferir_versao(chave[0], chave[1]):
+                return
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = entrada
+            self._tamanhos[chave] = entrada.tamanho
+            self.bytes += entrada.tamanho
+            self._liberar_espaco()
+
+    def recontar(self, chave):
+        """Atualiza o tamanho de uma entrada depois de ganhar uma versão comprimida."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return
+            self.bytes += entrada.tamanho - self._tamanhos[chave]
+            self._tamanhos[chave] = entrada.tamanho
+            self._liberar_espaco()
+
+    def invalidar(self, nome=None):
+        with self._lock:
+            if nome is None:
+                self._entradas.clear()
+                self._tamanhos.clear()
+                self._versoes.clear()
+                self.bytes = 0
+            else:
+                self._descartar_dataset(nome)
+                self._versoes.pop(nome, None)
+
+
+consultas = CacheConsultas()
+
+
+def etag_consulta(dataset, consulta):
+    """ETag forte da resposta: muda com o conteúdo da planilha, a rota e a consulta."""
+    base = repr((dataset.nome, dataset.fingerprint, request.path, consulta))
+    return f"{dataset.nome}-{hashlib.sha1(base.encode('utf-8')).hexdigest()[:24]}"
+
+
+def _responder(entrada, chave):
+    tamanho = len(entrada.codificados)
+    resposta = responder_bytes(entrada.corpo, entrada.mimetype, entrada.etag, entrada.codificados)
+    if len(entrada.codificados) != tamanho:
+        consultas.recontar(chave)
+    return resposta
+
+
+def cache_consulta(nome=None):
+    """
+    Decorator das rotas de dados: ETag/304 e cache da consulta normalizada
+    nesta versão do dataset. `nome` omitido = vem da URL (/api/<nome>/...).
+    Só respostas 200 são guardadas.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Import aqui para evitar ciclo (loader -> rotas -> serviços)
+            from mcdagua.core.loader import datasets, get_dataset
+
+            nome_dataset = nome or kwargs.get("nome")
+            if nome_dataset not in datasets:
+                return view(*args, **kwargs)
+
+            dataset = get_dataset(nome_dataset)
+            if not dataset.versao or not dataset.fingerprint:
+                # Arquivo ausente ou não configurado: nada para versionar
+                return view(*args, **kwargs)
+            try:
+                consulta = chave_consulta(request.args, dataset.df.columns)
+            except ParametroInvalido:
+                # A própria rota responde o 400
+                return view(*args, **kwargs)
+
+            etag = etag_consulta(dataset, consulta)
+            if nao_modificado(etag):
+                return resposta_304(etag)
+
+            consultas.limite_bytes = current_app.config.get("QUERY_CACHE_MAX_BYTES", LIMITE_BYTES_PADRAO)
+            chave = (nome_dataset, dataset.versao, request.path, consulta)
+            if consultas.limite_bytes:
+                entrada = consultas.obter(chave)
+                if entrada is not None:
+                    return _responder(entrada, chave)
+
+            resposta = current_app.make_response(view(*args, **kwargs))
+            if resposta.status_code != 200:
+                return resposta
+            if resposta.is_streamed or resposta.direct_passthrough:
+                # Streaming: o corpo nunca fica inteiro na memória, só ganha o ETag
+                resposta.set_etag(etag)
+                resposta.headers["Cache-Control"] = "no-cache"
+                return resposta
+
+            entrada = RespostaGuardada(resposta.get_data(), resposta.mimetype, etag)
+            if consultas.limite_bytes:
+                consultas.guardar(chave, entrada)
+            return _responder(entrada, chave)
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+import threading
+import pandas as pd
+from mcdagua.core.datas import PREFIXO_DERIVADA
+
+# ==============================================================================
+# CATÁLOGO DE COLUNAS (ESTATÍSTICAS POR VERSÃO DO DATASET)
+# ==============================================================================
+# /api/filtros-opcoes, /api/visa e /api/haccp varriam todas as colunas atrás dos
+# valores distintos a cada request (com LIMITE_UNICOS/LIMITE_OPCOES), e os
+# filtros não sabiam quais colunas cortam mais linhas. O catálogo reúne, para
+# cada coluna pública, uma vez por versão do dataset:
+#   tipo (o mesmo das expressões de filtro), linhas nulas/vazias, valores
+#   distintos, mínimo/máximo, os valores mais frequentes e, se não forem
+#   muitos, a lista ordenada de valores (fonte das opções de filtro).
+# A ingestão monta o catálogo logo depois de publicar a planilha; nos demais
+# workers cada coluna é calculada no primeiro uso. Exposto em
+# /api/<dataset>/catalog.
+
+# Acima disso a coluna não guarda a lista de valores (mesmo limite do /api/filtros-opcoes)
+LIMITE_VALORES = 1000
+
+# Valores mais frequentes guardados por coluna
+LIMITE_TOP = 5
+
+
+class EstatisticaColuna:
+    def __init__(self, nome, serie, tipada):
+        self.nome = nome
+        self.dtype = str(serie.dtype)
+        self.tipo = tipada.tipo
+        self.linhas = len(serie)
+
+        nulos = serie.isna().to_numpy()
+        self.nulos = int(nulos.sum())
+
+        # Mesmo texto que as telas mostram (astype(str)), contado por valor
+        contagens = serie[~nulos].astype(str).value_counts(sort=False)
+        em_branco = contagens.index.str.strip() == ""
+        preenchidas = contagens[~em_branco]
+        self.vazios = int(contagens[em_branco].sum())
+        self.distintos = len(preenchidas)
+
+        self.valores = sorted(preenchidas.index) if self.distintos <= LIMITE_VALORES else None
+        # Como nulos aparecem em astype(str) ("nan", "NaT"): as opções das
+        # telas VISA/HACCP sempre os mostraram
+        self.texto_nulos = sorted(set(serie[nulos].astype(str))) if self.nulos else []
+        self.distintos_texto = len(set(contagens.index) | set(self.texto_nulos))
+
+        top = sorted(preenchidas.items(), key=lambda item: (-item[1], item[0]))[:LIMITE_TOP]
+        self.top = [{"valor": v, "contagem": int(n)} for v, n in top]
+
+        self.minimo, self.maximo = self._extremos(tipada, preenchidas)
+
+    @staticmethod
+    def _extremos(tipada, preenchidas):
+        if tipada.tipo == "texto":
+            if not len(preenchidas):
+                return None, None
+            return min(preenchidas.index), max(preenchidas.index)
+
+        validos = tipada.valores[tipada.validos]
+        if not len(validos):
+            return None, None
+        minimo, maximo = validos.min(), validos.max()
+        if tipada.tipo == "data":
+            return pd.Timestamp(minimo).isoformat(), pd.Timestamp(maximo).isoformat()
+        return float(minimo), float(maximo)
+
+    def seletividade(self, valores):
+        """Fração estimada de linhas com um dos `valores` (igualdade)."""
+        return min(1.0, len(valores) / max(self.distintos, 1))
+
+    def to_dict(self):
+        return {
+            "tipo": self.tipo,
+            "dtype": self.dtype,
+            "linhas": self.linhas,
+            "nulos": self.nulos,
+            "vazios": self.vazios,
+            "distintos": self.distintos,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "top": self.top,
+            "valores_listados": self.valores is not None,
+        }
+
+
+class Catalogo:
+    def __init__(self, dataset):
+        # Import aqui: services/filters.py usa o catálogo para ordenar os filtros
+        from mcdagua.services.filters import indice_filtros
+
+        self.df = dataset.df
+        self.indice = indice_filtros(dataset)
+        self.linhas = len(self.df)
+        # Por posição: com nomes repetidos vale a primeira coluna (como em df[nome])
+        self.posicoes = {}
+        for i, nome in enumerate(self.df.columns):
+            if not str(nome).startswith(PREFIXO_DERIVADA):
+                self.posicoes.setdefault(nome, i)
+        self._colunas = {}
+        self._lock = threading.Lock()
+
+    def coluna(self, nome):
+        """EstatisticaColuna de `nome` (None se não for uma coluna pública)."""
+        if nome not in self.posicoes:
+            return None
+        if nome not in self._colunas:
+            with self._lock:
+                if nome not in self._colunas:
+                    serie = self.df.iloc[:, self.posicoes[nome]]
+                    self._colunas[nome] = EstatisticaColuna(nome, serie, self.indice.tipada(nome))
+        return self._colunas[nome]
+
+    @property
+    def colunas(self):
+        """Todas as colunas públicas, na ordem da planilha."""
+        return {nome: self.coluna(nome) for nome in self.posicoes}
+
+    def opcoes(self, coluna):
+        """Valores preenchidos ([] se a coluna tiver valores demais), como no /api/filtros-opcoes."""
+        estatistica = self.coluna(coluna)
+        return list(estatistica.valores) if estatistica.valores is not None else []
+
+    def opcoes_tela(self, coluna, limite):
+        """
+        Opções dos filtros das telas VISA/HACCP: a coluna entra se tiver entre
+        2 e `limite`-1 textos distintos (contando vazio e nulo).
+        """
+        estatistica = self.coluna(coluna)
+        if not 1 < estatistica.distintos_texto < limite or estatistica.valores is None:
+            return None
+        return sorted(set(estatistica.valores) | {t for t in estatistica.texto_nulos if t.strip() != ""})
+
+    def montar(self):
+        """Calcula todas as colunas de uma vez (ingestão)."""
+        for nome in self.posicoes:
+            self.coluna(nome)
+        return self
+
+    def to_dict(self):
+        return {
+            "linhas": self.linhas,
+            "colunas": {nome: e.to_dict() for nome, e in self.colunas.items()},
+        }
+
+
+def catalogo(dataset):
+    """Catálogo da versão atual do dataset (montado uma vez)."""
+    return dataset.memo("catalogo", lambda: Catalogo(dataset))
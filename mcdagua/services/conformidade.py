@@ -0,0 +1,238 @@
+import pandas as pd
+from mcdagua.core.workbook import WorkbookSession, abrir_sessao, indices_colunas_excel
+
+# ==============================================================================
+# MOTOR DE CONFORMIDADE (OK / NOK) DA ABA GERAL
+# ==============================================================================
+# Antes, cada gráfico de conformidade (Back Room mensal, Back Room por regional,
+# Gelo Pool mensal...) percorria a aba GERAL inteira célula a célula. Aqui cada
+# indicador é apenas declarado (coluna, valores NA, filtro de ano, agrupamento)
+# e todos são calculados juntos: mês, ano e regional são normalizados uma vez
+# para a aba inteira e a contagem de todos os indicadores sai de um único
+# groupby. Um parâmetro novo é só mais um `registrar(...)`.
+
+ORDEM_MESES = [
+    "janeiro", "fevereiro", "março", "abril", "maio", "junho",
+    "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"
+]
+
+REGIONAIS_INVALIDAS = ['NAN', 'NONE', '', '#N/A', '#N/D', 'NA']
+
+
+class MetricaConformidade:
+    """
+    Indicador de conformidade de uma coluna da aba GERAL.
+    - coluna: letra da coluna no Excel (ex: "I" para Back Room)
+    - por_regional: agrupa por Mês x Regional em vez de só por Mês
+    - ano: considera só linhas desse ano (linhas sem data válida entram)
+    - valores_na: valores desconsiderados da contagem
+    - valores_ok: valores conformes; qualquer outro valor preenchido é NOK
+    - regional_padrao: coluna usada se o cabeçalho 'Regional' não for achado
+    """
+
+    def __init__(self, nome, coluna, por_regional=False, ano=2026,
+                 valores_na=("na",), valores_ok=("ok",), regional_padrao="B"):
+        self.nome = nome
+        self.coluna = coluna
+        self.indice = indices_colunas_excel(coluna)[0]
+        self.por_regional = por_regional
+        self.ano = ano
+        self.valores_na = list(valores_na)
+        self.valores_ok = list(valores_ok)
+        self.indice_regional_padrao = indices_colunas_excel(regional_padrao)[0]
+
+    def vazio(self):
+        if self.por_regional:
+            return {"meses": [], "regionais": [], "dados": {}}
+        return {"labels": [], "ok": [], "nok": [], "ok_pct": [], "nok_pct": []}
+
+
+def _texto(serie):
+    """str(valor).strip().lower() célula a célula, mantendo vazias como NaN."""
+    return serie.where(serie.isna(), serie.astype(str).str.strip().str.lower())
+
+
+def _ano_de_valor(valor):
+    if valor is None or pd.isna(valor):
+        return None
+    try:
+        if hasattr(valor, 'year'):
+            return valor.year
+        dt = pd.to_datetime(valor, errors='coerce')
+        if pd.notna(dt):
+            return dt.year
+    except Exception:
+        pass
+    return None
+
+
+def _anos(serie):
+    # Poucas datas distintas na planilha: converte cada valor único uma vez
+    unicos = {v: _ano_de_valor(v) for v in pd.unique(serie)}
+    return serie.map(unicos)
+
+
+def _ordenar_meses(meses):
+    return sorted(meses, key=lambda x: ORDEM_MESES.index(x) if x in ORDEM_MESES else 999)
+
+
+def _pct(parte, total):
+    return round((parte / total) * 100, 1) if total > 0 else 0
+
+
+class MotorConformidade:
+    ABA = "GERAL"
+    LINHA_CABECALHO = 2  # linha do Excel com os nomes das colunas
+    LINHA_DADOS = 3      # primeira linha de dados
+    COL_MES = "D"
+    COL_DATA = "E"
+
+    def __init__(self):
+        self._metricas = {}
+
+    def registrar(self, metrica):
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    @property
+    def metricas(self):
+        return list(self._metricas.values())
+
+    def metrica(self, nome):
+        return self._metricas[nome]
+
+    def _indice_regional(self, bruto):
+        """Procura 'Regional'/'Regiao' nas 20 primeiras colunas do cabeçalho."""
+        if len(bruto) < self.LINHA_CABECALHO:
+            return None
+        cabecalho = bruto.iloc[self.LINHA_CABECALHO - 1, :20]
+        for i, valor in enumerate(cabecalho):
+            val = '' if pd.isna(valor) else str(valor).strip().lower()
+            if 'regional' in val or 'regiao' in val:
+                return i
+        return None
+
+    def calcular(self, fonte):
+        """
+        Calcula todos os indicadores registrados. `fonte` é o caminho da
+        planilha ou uma WorkbookSession. Retorna {nome_metrica: resultado}.
+        """
+        sessao = fonte if isinstance(fonte, WorkbookSession) else abrir_sessao(fonte)
+        bruto = sessao.aba(self.ABA)
+        if bruto is None:
+            raise KeyError(f"Worksheet {self.ABA} does not exist.")
+
+        dados = bruto.iloc[self.LINHA_DADOS - 1:]
+        largura = dados.shape[1]
+
+        def coluna(idx):
+            if idx < largura:
+                return dados.iloc[:, idx]
+            return pd.Series(None, index=dados.index, dtype=object)
+
+        # Normalizações compartilhadas por todos os indicadores
+        mes = _texto(coluna(indices_colunas_excel(self.COL_MES)[0]))
+        anos = _anos(coluna(indices_colunas_excel(self.COL_DATA)[0]))
+        idx_regional = self._indice_regional(bruto)
+        regionais = {}
+
+        partes = []
+        for m in self.metricas:
+            valor = _texto(coluna(m.indice))
+            mask = valor.notna() & mes.notna() & ~valor.isin(m.valores_na)
+            if m.ano is not None:
+                mask &= anos.isna() | (anos == m.ano)
+
+            regional = ""
+            if m.por_regional:
+                idx = idx_regional if idx_regional is not None else m.indice_regional_padrao
+                if idx not in regionais:
+                    bruto_reg = coluna(idx)
+                    regionais[idx] = bruto_reg.where(bruto_reg.isna(), bruto_reg.astype(str).str.strip().str.upper())
+                mask &= regionais[idx].notna() & ~regionais[idx].isin(REGIONAIS_INVALIDAS)
+                regional = regionais[idx][mask]
+
+            partes.append(pd.DataFrame({
+                "metrica": m.nome,
+                "mes": mes[mask],
+                "regional": regional,
+                "ok": valor[mask].isin(m.valores_ok),
+            }))
+
+        longo = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=["metrica", "mes", "regional", "ok"])
+        contagens = longo.groupby(["metrica", "mes", "regional", "ok"], sort=False).size()
+
+        resultados = {}
+        for m in self.metricas:
+            sub = longo[longo["metrica"] == m.nome]
+            if sub.empty:
+                resultados[m.nome] = m.vazio()
+                continue
+            if m.por_regional:
+                resultados[m.nome] = self._formatar_regional(m, sub, contagens)
+            else:
+                resultados[m.nome] = self._formatar_mensal(m, sub, contagens)
+            print(f"✅ [CONFORMIDADE] {m.nome}: {len(sub)} registros")
+
+        return resultados
+
+    def _formatar_mensal(self, m, sub, contagens):
+        labels, ok_vals, nok_vals, ok_pcts, nok_pcts = [], [], [], [], []
+        for mes in _ordenar_meses(pd.unique(sub["mes"])):
+            ok = int(contagens.get((m.nome, mes, "", True), 0))
+            nok = int(contagens.get((m.nome, mes, "", False), 0))
+            labels.append(mes.capitalize())
+            ok_vals.append(ok)
+            nok_vals.append(nok)
+            ok_pcts.append(_pct(ok, ok + nok))
+            nok_pcts.append(_pct(nok, ok + nok))
+
+        return {"labels": labels, "ok": ok_vals, "nok": nok_vals, "ok_pct": ok_pcts, "nok_pct": nok_pcts}
+
+    def _formatar_regional(self, m, sub, contagens):
+        meses_ordenados = _ordenar_meses(pd.unique(sub["mes"]))
+        regionais_ordenadas = sorted(pd.unique(sub["regional"]))
+
+        dados = {}
+        for mes in meses_ordenados:
+            mes_cap = mes.capitalize()
+            dados[mes_cap] = {}
+            for regional in regionais_ordenadas:
+                ok = int(contagens.get((m.nome, mes, regional, True), 0))
+                nok = int(contagens.get((m.nome, mes, regional, False), 0))
+                dados[mes_cap][regional] = {
+                    'ok': ok,
+                    'nok': nok,
+                    'ok_pct': _pct(ok, ok + nok),
+                    'nok_pct': _pct(nok, ok + nok),
+                }
+
+        return {
+            "meses": [mes.capitalize() for mes in meses_ordenados],
+            "regionais": regionais_ordenadas,
+            "dados": dados
+        }
+
+
+# --- INDICADORES DA ABA GERAL (POTABILIDADE) ---
+motor_conformidade = MotorConformidade()
+
+for _prefixo, _coluna in [
+    ("backroom", "I"),       # Back Room
+    ("gelopool", "S"),       # Gelo (pool)
+    ("maquinagelo", "W"),    # Máquina de Gelo
+    ("bincafe", "AA"),       # Bin Café
+    ("binbebidas", "AE"),    # Bin Bebidas
+]:
+    motor_conformidade.registrar(MetricaConformidade(f"{_prefixo}_mensal", _coluna))
+    motor_conformidade.registrar(MetricaConformidade(
+        f"{_prefixo}_regional", _coluna, por_regional=True,
+        # Fallbacks históricos: Back Room usava a coluna B, Gelo Pool a C
+        regional_padrao="B" if _prefixo == "backroom" else "C",
+    ))
+
+
+def calcular_conformidade(fonte):
+    """Todos os indicadores de conformidade, memorizados por versão da planilha."""
+    sessao = fonte if isinstance(fonte, WorkbookSession) else abrir_sessao(fonte)
+    return sessao.memo("conformidade", lambda: motor_conformidade.calcular(sessao))
@@ -0,0 +1,341 @@
+import json
+import base64
+import numpy as np
+import pandas as pd
+from werkzeug.http import http_date
+from mcdagua.core.datas import colunas_publicas
+from mcdagua.services.expressoes import ParametroInvalido
+from mcdagua.services.filters import filtrar_linhas
+from mcdagua.services.ordenacao import indice_ordenacao
+
+# ==============================================================================
+# CONSULTA DAS TABELAS (/api/geral, /api/visa, /api/haccp)
+# ==============================================================================
+# Junta filtros, ordenação e paginação sobre um Dataset e devolve só as linhas
+# da página. Sem esses parâmetros a resposta continua sendo a tabela filtrada
+# inteira, na ordem da planilha, como sempre foi.
+#
+# Filtros: ?regional=SP|RJ, ?q=texto e as expressões de services/expressoes.py
+# (?data_coleta>=2026-01-01&status!=ok&cloro_mg_l:0.2..2.0)
+#
+# Ordenação: ?sort=regional,-data_coleta (prefixo "-" = decrescente)
+#
+# Projeção: ?fields=codigo,regional,mes  ou  ?exclude=br_p9,br_p10
+# Só as colunas pedidas são copiadas e serializadas; busca e filtros de coluna
+# continuam valendo para todas.
+#
+# Paginação:
+#   ?limit=100&offset=200      (ou ?per_page=100&page=3)
+#   ?limit=100&cursor=<token>  (keyset: continua depois da última linha vista)
+# O cursor guarda a impressão digital da planilha, a ordenação e a posição da
+# última linha nela; se a planilha (ou o sort) mudar o cursor deixa de valer
+# (400) e o cliente recomeça do início.
+#
+# Formato: ?format=rows (padrão, uma lista de objetos {coluna: valor}) ou
+# ?format=columnar ("dados" = uma lista de valores por coluna, na ordem de
+# "colunas"), que não repete os nomes das colunas em cada linha. Os valores
+# prontos para o JSON são gerados coluna a coluna só para as linhas da
+# resposta (uma página custa o tamanho da página, não o da planilha); nada
+# disso fica guardado por versão, o que duplicaria a planilha em cada worker.
+#
+# Streaming (tabelas grandes): ?format=ndjson devolve uma linha JSON por
+# registro (application/x-ndjson, total e próximo cursor nos cabeçalhos) e
+# ?stream=1 envia o mesmo documento de rows/columnar em pedaços. Nos dois casos
+# o corpo é gerado em lotes de LOTE_STREAM linhas: o primeiro lote sai logo e o
+# worker nunca monta a resposta inteira na memória.
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 5000
+
+FORMATOS = ("rows", "columnar", "ndjson")
+
+# Linhas por pedaço nas respostas em streaming
+LOTE_STREAM = 1000
+
+
+class Paginacao:
+    def __init__(self, limit, offset=0, cursor=None):
+        self.limit = limit
+        self.offset = offset
+        self.cursor = cursor
+
+    @classmethod
+    def dos_args(cls, args):
+        """Paginação pedida na URL, ou None se não houver nenhum parâmetro."""
+        if not any(args.get(p) for p in ("limit", "per_page", "page", "offset", "cursor")):
+            return None
+
+        limit = _inteiro(args, "limit", None)
+        if limit is None:
+            limit = _inteiro(args, "per_page", LIMITE_PADRAO)
+        if not 1 <= limit <= LIMITE_MAXIMO:
+            raise ParametroInvalido(f"limit deve estar entre 1 e {LIMITE_MAXIMO}.")
+
+        offset = _inteiro(args, "offset", None)
+        if offset is None:
+            pagina = _inteiro(args, "page", 1)
+            if pagina < 1:
+                raise ParametroInvalido("page deve ser maior ou igual a 1.")
+            offset = (pagina - 1) * limit
+        if offset < 0:
+            raise ParametroInvalido("offset não pode ser negativo.")
+
+        return cls(limit, offset, args.get("cursor") or None)
+
+
+def _inteiro(args, nome, padrao):
+    valor = args.get(nome)
+    if valor in (None, ""):
+        return padrao
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f"{nome} deve ser um número inteiro.")
+
+
+def ler_ordenacao(args, colunas):
+    """'regional,-data_coleta' -> (('regional', False), ('data_coleta', True))."""
+    campos = []
+    for parte in (args.get("sort") or "").split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        decrescente = parte.startswith("-")
+        coluna = parte.lstrip("+-").strip()
+        if coluna not in colunas:
+            raise ParametroInvalido(f"Coluna de ordenação desconhecida: {coluna}")
+        campos.append((coluna, decrescente))
+    return tuple(campos)
+
+
+def _lista(args, nome):
+    return [c.strip() for c in (args.get(nome) or "").split(",") if c.strip()]
+
+
+def ler_projecao(args, df):
+    """
+    Posições das colunas da resposta (fields=/exclude=), na ordem pedida e
+    sempre sem as colunas internas.
+    """
+    publicas = colunas_publicas(df)
+    campos, excluir = _lista(args, "fields"), _lista(args, "exclude")
+
+    desconhecidas = [c for c in campos + excluir if c not in publicas]
+    if desconhecidas:
+        raise ParametroInvalido(f"Coluna(s) desconhecida(s): {', '.join(desconhecidas)}")
+
+    # Por posição: a planilha pode ter nomes de coluna repetidos
+    nomes = list(df.columns)
+    if campos:
+        posicoes = [i for c in dict.fromkeys(campos) for i, n in enumerate(nomes) if n == c]
+    else:
+        posicoes = [i for i, n in enumerate(nomes) if n in publicas]
+    return [i for i in posicoes if nomes[i] not in excluir]
+
+
+def _texto_ordenacao(campos):
+    return ",".join(("-" if desc else "") + col for col, desc in campos)
+
+
+def _versao_cursor(dataset):
+    # Impressão digital do conteúdo (igual em todos os workers), não a versão local
+    return (dataset.fingerprint or "0")[:12]
+
+
+def codificar_cursor(dataset, campos, chave):
+    dados = json.dumps(
+        {"v": _versao_cursor(dataset), "o": _texto_ordenacao(campos), "k": int(chave)},
+        separators=(",", ":"), ensure_ascii=False,
+    )
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(dataset, campos, cursor):
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        versao, ordem, chave = dados["v"], dados.get("o", ""), int(dados["k"])
+    except Exception:
+        raise ParametroInvalido("Cursor inválido.")
+    if versao != _versao_cursor(dataset):
+        raise ParametroInvalido("Cursor expirado: a planilha foi atualizada. Recomece do início.")
+    if ordem != _texto_ordenacao(campos):
+        raise ParametroInvalido("Cursor gerado para outra ordenação. Recomece do início.")
+    return chave
+
+
+def ler_formato(args):
+    formato = (args.get("format") or "rows").strip().lower()
+    if formato not in FORMATOS:
+        raise ParametroInvalido(f"format deve ser um de: {', '.join(FORMATOS)}.")
+    return formato
+
+
+def _valores_json(serie, modo):
+    """
+    Valores da coluna como o JSON da resposta os mostra: modo "texto" é o
+    astype(str) do /api/geral; modo "nativo" é o to_dict() das telas VISA/HACCP
+    (números como números, datas no formato HTTP do jsonify).
+    """
+    if modo == "texto":
+        return serie.astype(str).to_numpy(dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        unicos = {v: (None if pd.isna(v) else http_date(pd.Timestamp(v).to_pydatetime()))
+                  for v in pd.unique(serie)}
+        return serie.map(unicos).to_numpy(dtype=object)
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie.to_numpy()
+    return serie.to_numpy(dtype=object)
+
+
+def ler_stream(args):
+    """?stream=1: resposta em pedaços (ndjson é sempre em streaming)."""
+    return ler_formato(args) == "ndjson" or (args.get("stream") or "").lower() in ("1", "true", "sim")
+
+
+def valores_json(dataset, posicao, modo, linhas=None):
+    """Valores prontos para o JSON da coluna `posicao`, só nas `linhas` (None = todas)."""
+    df = dataset.df
+    serie = df.iloc[:, posicao] if linhas is None else df.iloc[linhas, posicao]
+    return _valores_json(serie, modo)
+
+
+class ResultadoConsulta:
+    def __init__(self, dataset, linhas, projecao, total, paginacao=None):
+        self.dataset = dataset
+        self.linhas = linhas        # posições das linhas (None = todas, na ordem da planilha)
+        self.projecao = projecao    # posições das colunas
+        self.total = total
+        self.paginacao = paginacao
+        self._df = None
+
+    @property
+    def colunas(self):
+        nomes = self.dataset.df.columns
+        return [nomes[i] for i in self.projecao]
+
+    @property
+    def df(self):
+        """As linhas/colunas do resultado como DataFrame (cópia feita só se alguém pedir)."""
+        if self._df is None:
+            df = self.dataset.df
+            self._df = df.iloc[:, self.projecao] if self.linhas is None else df.iloc[self.linhas, self.projecao]
+        return self._df
+
+    def _series(self):
+        """Colunas do resultado como Series (um take por página; sem cópia na tabela inteira)."""
+        if self.linhas is None:
+            return [self.dataset.df.iloc[:, p] for p in self.projecao]
+        recorte = self.df
+        return [recorte.iloc[:, i] for i in range(recorte.shape[1])]
+
+    def __len__(self):
+        return len(self.dataset.df) if self.linhas is None else len(self.linhas)
+
+    def dados(self, modo="nativo", formato="rows"):
+        """
+        Conteúdo de "dados": lista de objetos (rows) ou uma lista de valores
+        por coluna (columnar), sem montar DataFrame intermediário.
+        """
+        valores = [_valores_json(serie, modo).tolist() for serie in self._series()]
+
+        if formato == "columnar":
+            return valores
+        if not valores:
+            return [{} for _ in range(len(self))]
+        colunas = self.colunas
+        return [dict(zip(colunas, linha)) for linha in zip(*valores)]
+
+    def _posicoes_lotes(self, tamanho):
+        """Posições das linhas do resultado em fatias de até `tamanho`."""
+        linhas = self.linhas if self.linhas is not None else np.arange(len(self.dataset.df))
+        for inicio in range(0, len(linhas), tamanho):
+            yield linhas[inicio:inicio + tamanho]
+
+    def _lotes(self, modo, tamanho):
+        """Registros (dicts) em listas de até `tamanho`, convertendo só as linhas de cada lote."""
+        df = self.dataset.df
+        colunas = self.colunas
+        for lote in self._posicoes_lotes(tamanho):
+            recorte = df.iloc[lote, self.projecao]
+            valores = [_valores_json(recorte.iloc[:, i], modo).tolist() for i in range(recorte.shape[1])]
+            if not valores:
+                yield [{} for _ in range(len(lote))]
+            else:
+                yield [dict(zip(colunas, linha)) for linha in zip(*valores)]
+
+    def ndjson(self, modo, codificar, tamanho=LOTE_STREAM):
+        """Gerador de bytes: um registro JSON por linha."""
+        for lote in self._lotes(modo, tamanho):
+            yield b"".join(codificar(registro) + b"\n" for registro in lote)
+
+    def json_em_partes(self, cabecalho, modo, formato, codificar, tamanho=LOTE_STREAM):
+        """
+        Gerador de bytes do documento {**cabecalho, "dados": [...]}, idêntico
+        (após o parse) à resposta não-streaming no mesmo formato.
+        """
+        inicio = codificar(cabecalho)
+        yield inicio[:-1] + (b',"dados":[' if len(inicio) > 2 else b'"dados":[')
+
+        primeiro = True
+        if formato == "columnar":
+            # Coluna por coluna, cada uma em lotes de `tamanho` valores
+            for posicao in self.projecao:
+                yield b"[" if primeiro else b",["
+                primeiro = False
+                separador = b""
+                for lote in self._posicoes_lotes(tamanho):
+                    yield separador + codificar(valores_json(self.dataset, posicao, modo, lote).tolist())[1:-1]
+                    separador = b","
+                yield b"]"
+        else:
+            for lote in self._lotes(modo, tamanho):
+                if not lote:
+                    continue
+                parte = codificar(lote)[1:-1]
+                yield parte if primeiro else b"," + parte
+                primeiro = False
+        yield b"]}"
+
+
+def consultar(dataset, args):
+    """Aplica filtros, ordenação e paginação do request sobre o Dataset."""
+    df = dataset.df
+    pag = Paginacao.dos_args(args)
+    campos = ler_ordenacao(args, df.columns)
+    projecao = ler_projecao(args, df)
+    linhas = filtrar_linhas(df, args, dataset)
+
+    # `chaves` = posição de cada linha selecionada na ordem da resposta
+    # (crescente), usada pelo cursor
+    if campos:
+        ordem = indice_ordenacao(dataset).ordem(campos)
+        if linhas is None:
+            chaves = np.arange(len(df))
+        else:
+            selecionadas = np.zeros(len(df), dtype=bool)
+            selecionadas[linhas] = True
+            chaves = np.flatnonzero(selecionadas[ordem])
+        linhas = ordem[chaves]
+    elif linhas is not None:
+        chaves = linhas
+
+    if pag is None:
+        return ResultadoConsulta(dataset, linhas, projecao, len(df) if linhas is None else len(linhas))
+
+    if linhas is None:
+        linhas = chaves = np.arange(len(df))
+    total = len(linhas)
+
+    if pag.cursor is not None:
+        inicio = int(np.searchsorted(chaves, decodificar_cursor(dataset, campos, pag.cursor), side="right"))
+    else:
+        inicio = min(pag.offset, total)
+    fim = min(inicio + pag.limit, total)
+
+    meta = {
+        "total": total,
+        "limit": pag.limit,
+        "offset": inicio,
+        "proximo_cursor": codificar_cursor(dataset, campos, chaves[fim - 1]) if fim < total else None,
+    }
+    return ResultadoConsulta(dataset, linhas[inicio:fim], projecao, total, meta)
@@ -0,0 +1,93 @@
+from mcdagua.core.loader import load_geral_dataframe, load_haccp_graphics_data
+from mcdagua.core.workbook import abrir_sessao
+from mcdagua.services.excel_processor import (
+    ler_range_exato, 
+    processar_evolucao_anual_anos, # NOVA FUNÇÃO
+    processar_pendencias_regional_meses, # NOVO FORMATO
+    processar_status_bloco, 
+    processar_pendencias_top,
+    processar_aba_geral
+)
+from mcdagua.services.conformidade import calcular_conformidade, motor_conformidade
+from mcdagua.services.kpis import (
+    get_programado_realizado, 
+    get_tipo_coleta_por_mes, 
+    get_nao_conformidade_por_gerente
+)
+
+# ==============================================================================
+# PAYLOADS DOS DASHBOARDS
+# ==============================================================================
+# Montagem dos JSONs de /api/graficos-data (TelaGraficos / DashboardCliente) e
+# /api/haccp-graficos (TelaGraficosHACCP). Dependem só da planilha enviada, por
+# isso são calculados na ingestão e materializados em disco (core/payloads.py).
+
+
+def montar_graficos_data(path):
+    """Payload completo de /api/graficos-data a partir da planilha de Potabilidade."""
+    print("\n🚀 [API] Lendo gráficos dos intervalos fixos...")
+    response_data = {}
+
+    ABA = "Gráfico pendencia"
+
+    # Abre a planilha uma única vez: ranges e processadores leem desta sessão
+    sessao = abrir_sessao(path)
+
+    # 1. EVOLUÇÃO ANUAL (K3:N15) -> AGORA LÊ ANOS (2023, 2024...)
+    print(f"📂 Lendo Anual: {ABA} K3:O15")
+    df_anual = ler_range_exato(sessao, ABA, "3:15", usecols="K:O")
+    # Usa a função nova que entende colunas de anos
+    response_data["restaurante_anual"] = processar_evolucao_anual_anos(df_anual)
+
+    # 2. PENDÊNCIAS POR REGIONAL (K20:O32) -> Novo Formato
+    print(f"📂 Lendo Regional: {ABA} K20:O32")
+    df_regional = ler_range_exato(sessao, ABA, "20:32", usecols="K:O")
+    response_data["restaurante_regional"] = processar_pendencias_regional_meses(df_regional)
+
+    # 3. BACK ROOM STATUS (K38:O42)
+    print(f"📂 Lendo Back Room: {ABA} K38:O42")
+    df_back = ler_range_exato(sessao, ABA, "38:42", usecols="K:O")
+    response_data["backroom"] = processar_status_bloco(df_back)
+
+    # 4. GELO STATUS (K50:O54)
+    print(f"📂 Lendo Gelo Status: {ABA} K50:O54")
+    df_gelo = ler_range_exato(sessao, ABA, "50:54", usecols="K:O")
+    response_data["gelo"] = processar_status_bloco(df_gelo)
+
+    # 5. PENDÊNCIAS GELO (K65:N69)
+    print(f"📂 Lendo Pendências Gelo: {ABA} K65:N69")
+    df_pend = ler_range_exato(sessao, ABA, "65:69", usecols="K:N")
+    response_data["pendencias_gelo"] = processar_pendencias_top(df_pend)
+
+    # Extras (dados da aba GERAL)
+    df_geral = load_geral_dataframe()
+    response_data["programado_realizado"] = get_programado_realizado(df_geral)
+    response_data["tipo_coleta"] = get_tipo_coleta_por_mes(df_geral)
+    response_data["nao_conformidade_gm"] = get_nao_conformidade_por_gerente(df_geral)
+    
+    # Conformidade OK/NOK mensal e por regional (Back Room, Gelo Pool,
+    # Máquina de Gelo, Bin Café, Bin Bebidas): uma passada só na aba GERAL
+    try:
+        conformidade = calcular_conformidade(sessao)
+    except Exception as e:
+        print(f"⚠️ [CONFORMIDADE] Erro: {e}")
+        conformidade = {}
+    for metrica in motor_conformidade.metricas:
+        response_data[metrica.nome] = conformidade.get(metrica.nome, metrica.vazio())
+    
+    try:
+        dados_geral, _ = processar_aba_geral(sessao)
+        if dados_geral and "detalhes_parametros" in dados_geral:
+            response_data["detalhes_parametros"] = dados_geral["detalhes_parametros"]
+    except: pass
+
+    return response_data
+
+
+def montar_haccp_graficos(path):
+    """Payload de /api/haccp-graficos (aba GRÁFICO da planilha HACCP)."""
+    data = load_haccp_graphics_data(path)
+    response_data = {}
+    for cat, val in data.items():
+        response_data[cat] = {"labels": list(val.keys()), "values": list(val.values())} if val else {"labels": [], "values": []}
+    return response_data
@@ -0,0 +1,220 @@
+import io
+import tempfile
+import numpy as np
+import pandas as pd
+from mcdagua.services.consulta import consultar
+from mcdagua.services.expressoes import ParametroInvalido
+
+# ==============================================================================
+# EXPORTAÇÃO DAS TABELAS FILTRADAS (/api/<dataset>/export)
+# ==============================================================================
+# O único export era o /download/<tipo>, o .xlsx cru do upload, que os analistas
+# voltavam a interpretar nas ferramentas deles. Aqui sai o DataFrame já limpo e
+# tipado (datas como datas, números como números), com os mesmos filtros,
+# ordenação, projeção e paginação das rotas de tabela:
+#
+#   /api/geral/export?format=arrow&regional=SAO1&fields=codigo,data_coleta
+#   /api/geral/export?format=parquet&data_coleta>=hoje-30d
+#   /api/visa/export?format=xlsx&regional=SP|RJ
+#
+# arrow:   Arrow IPC em formato stream (application/vnd.apache.arrow.stream),
+#          lido direto pelo pyarrow/pandas/polars e pelo tableFromIPC do
+#          apache-arrow no navegador: transporte compacto para telas grandes.
+# parquet: um arquivo .parquet (um row group por lote).
+# csv:     para abrir no Excel em português: ";" entre colunas, vírgula
+#          decimal e BOM UTF-8 (acentos corretos). Enviado em lotes de
+#          LOTE_PLANILHA linhas.
+# xlsx:    openpyxl em modo write-only: as linhas vão para um arquivo
+#          temporário em lotes e o .xlsx pronto é enviado em pedaços.
+#
+# Em todos os formatos o corpo é gerado em lotes (df.iloc[lote, projecao]):
+# só o lote da vez é convertido, nada fica guardado por versão e o arquivo
+# inteiro nunca fica na memória. No arrow/parquet o tipo de cada coluna é
+# decidido antes do primeiro lote, para todos saírem com o mesmo schema.
+
+FORMATOS_EXPORTACAO = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# Linhas por lote (record batch / row group)
+LOTE_EXPORTACAO = 65536
+
+# Linhas por lote no CSV/XLSX (convertidas célula a célula)
+LOTE_PLANILHA = 5000
+
+# Pedaços do .xlsx pronto enviados ao cliente
+PEDACO_ARQUIVO = 256 * 1024
+
+
+def ler_formato_exportacao(args):
+    formato = (args.get("format") or "arrow").strip().lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ParametroInvalido(f"format deve ser um de: {', '.join(FORMATOS_EXPORTACAO)}.")
+    return formato
+
+
+# Tipo Arrow das colunas object pelo que o pandas enxerga nelas (demais = texto)
+TIPOS_OBJECT = {
+    "integer": "int64",
+    "floating": "float64",
+    "mixed-integer-float": "float64",
+    "boolean": "bool_",
+    "datetime": "timestamp",
+    "datetime64": "timestamp",
+}
+
+
+def _tipo_arrow(serie):
+    """Tipo Arrow fixo da coluna (o mesmo em todos os lotes)."""
+    import pyarrow as pa
+
+    if serie.dtype != object:
+        vazio = serie.iloc[:0].to_frame(name="c")
+        return pa.Schema.from_pandas(vazio, preserve_index=False).field("c").type
+    tipo = TIPOS_OBJECT.get(pd.api.types.infer_dtype(serie, skipna=True))
+    if tipo == "timestamp":
+        return pa.timestamp("ns")
+    return getattr(pa, tipo)() if tipo else pa.string()
+
+
+def schema_arrow(resultado):
+    """Schema do export: nomes e tipos das colunas pedidas."""
+    import pyarrow as pa
+
+    df = resultado.dataset.df
+    nomes = [str(c) for c in resultado.colunas]
+    return pa.schema([pa.field(n, _tipo_arrow(df.iloc[:, p])) for n, p in zip(nomes, resultado.projecao)])
+
+
+def _lote_arrow(lote, schema):
+    """DataFrame do lote como RecordBatch no `schema` do export."""
+    import pyarrow as pa
+
+    arrays = []
+    for i, campo in enumerate(schema):
+        serie = lote.iloc[:, i]
+        try:
+            arrays.append(pa.array(serie, type=campo.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if campo.type != pa.string():
+                raise
+            # Coluna object com tipos misturados (número e texto na mesma coluna): vai como texto
+            arrays.append(pa.array(serie.astype(str).where(serie.notna()), type=pa.string(), from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Saida(io.RawIOBase):
+    """Arquivo só de escrita que acumula os bytes até alguém recolhê-los."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def recolher(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _lotes_arrow(resultado, schema, tamanho):
+    import pyarrow as pa
+
+    saida = _Saida()
+    with pa.ipc.new_stream(saida, schema) as escritor:
+        for lote in _lotes_linhas(resultado, tamanho):
+            escritor.write_batch(_lote_arrow(lote, schema))
+            yield saida.recolher()
+    yield saida.recolher()
+
+
+def _lotes_parquet(resultado, schema, tamanho):
+    import pyarrow.parquet as pq
+
+    saida = _Saida()
+    with pq.ParquetWriter(saida, schema) as escritor:
+        vazio = True
+        for lote in _lotes_linhas(resultado, tamanho):
+            escritor.write_batch(_lote_arrow(lote, schema))
+            vazio = False
+            yield saida.recolher()
+        if vazio:
+            escritor.write_table(schema.empty_table())
+    yield saida.recolher()
+
+
+def _lotes_linhas(resultado, tamanho):
+    """DataFrames de até `tamanho` linhas do resultado (só as colunas pedidas)."""
+    df = resultado.dataset.df
+    linhas = resultado.linhas if resultado.linhas is not None else np.arange(len(df))
+    for inicio in range(0, len(linhas), tamanho):
+        yield df.iloc[linhas[inicio:inicio + tamanho], resultado.projecao]
+
+
+def _lotes_csv(resultado, tamanho):
+    yield "\ufeff".encode("utf-8")
+    yield (";".join(str(c) for c in resultado.colunas) + "\r\n").encode("utf-8")
+    for lote in _lotes_linhas(resultado, tamanho):
+        yield lote.to_csv(sep=";", decimal=",", header=False, index=False, lineterminator="\r\n").encode("utf-8")
+
+
+def _valores_planilha(serie):
+    """Valores da coluna como o openpyxl grava (datas, números e textos do Python; vazio = None)."""
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        return [None if pd.isna(v) else v.to_pydatetime() for v in serie]
+    valores = serie.astype(object).where(serie.notna(), None).tolist()
+    # Caracteres de controle (comuns em textos colados no Excel) o openpyxl recusa
+    return [ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v for v in valores]
+
+
+def _lotes_xlsx(resultado, tamanho, titulo):
+    from openpyxl import Workbook
+
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(title=titulo)
+    aba.append([str(c) for c in resultado.colunas])
+    for lote in _lotes_linhas(resultado, tamanho):
+        for linha in zip(*(_valores_planilha(lote.iloc[:, i]) for i in range(lote.shape[1]))):
+            aba.append(linha)
+
+    with tempfile.TemporaryFile() as arquivo:
+        planilha.save(arquivo)
+        arquivo.seek(0)
+        while True:
+            pedaco = arquivo.read(PEDACO_ARQUIVO)
+            if not pedaco:
+                break
+            yield pedaco
+
+
+def exportar(dataset, args, formato):
+    """
+    (ResultadoConsulta, gerador de bytes) do export no `formato` pedido.
+    Filtros e paginação são validados aqui, antes do primeiro byte.
+    """
+    resultado = consultar(dataset, args)
+    if formato == "csv":
+        lotes = _lotes_csv(resultado, LOTE_PLANILHA)
+    elif formato == "xlsx":
+        import openpyxl  # noqa: F401  (falta de openpyxl vira erro antes do primeiro byte)
+        lotes = _lotes_xlsx(resultado, LOTE_PLANILHA, dataset.nome.upper())
+    else:
+        schema = schema_arrow(resultado)
+        lotes = (_lotes_arrow if formato == "arrow" else _lotes_parquet)(resultado, schema, LOTE_EXPORTACAO)
+    return resultado, (parte for parte in lotes if parte)
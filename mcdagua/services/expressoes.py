@@ -0,0 +1,217 @@
+import re
+import warnings
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from mcdagua.core.datas import converter_datas
+from mcdagua.services.busca import dobrar_texto
+
+# ==============================================================================
+# EXPRESSÕES DE FILTRO (FAIXAS, NEGAÇÃO, DATAS, NÚMEROS)
+# ==============================================================================
+# Além de "coluna=valor" (igualdade sem maiúsculas, listas com "|"), as rotas
+# de tabela aceitam:
+#
+#   data_coleta>=2026-01-01     comparação (>, >=, <, <=)
+#   data_coleta>=hoje-30d       datas relativas: hoje, hoje-30d, hoje+7d
+#   status!=ok                  diferente (aceita lista: status!=ok|na)
+#   cloro_mg_l:0.2..2.0         faixa fechada (um dos lados pode faltar: :..2.0)
+#   regional:in:SP|RJ           um dos valores  (:nin: = nenhum deles)
+#
+# direto na URL (/api/geral?data_coleta>=2026-01-01&status!=ok) ou em
+# ?filter=<expr>, que pode se repetir ou separar expressões com ";".
+#
+# Comparações e faixas usam o tipo da coluna: datas e números pela ordem
+# natural (colunas de texto em que quase todo valor é número/data são tratadas
+# como tal, com vírgula decimal aceita), demais textos sem maiúsculas/acentos.
+# Células vazias nunca entram numa comparação. Uma data sem hora vale o dia
+# inteiro: data<=2026-01-31 inclui o dia 31 todo.
+#
+# A coluna vira um vetor tipado uma vez por versão do dataset
+# (services/filters.py) e cada expressão é uma comparação do NumPy sobre ele.
+
+Expressao = namedtuple("Expressao", ["coluna", "operador", "valor"])
+
+# Ordem importa: operadores mais longos primeiro
+OPERADORES = [
+    ("!=", "nin"), (">=", "ge"), ("<=", "le"), (">", "gt"), ("<", "lt"),
+    (":in:", "in"), (":nin:", "nin"), (":", "entre"), ("=", "in"),
+]
+
+# Fração mínima dos valores preenchidos que precisam ser número/data para a
+# coluna de texto ser comparada como número/data
+FRACAO_TIPADA = 0.8
+
+# Valores distintos testados antes de tentar ler a coluna de texto inteira como data
+AMOSTRA_DATAS = 50
+
+DATA_RELATIVA = re.compile(r"^hoje(?:([+-])(\d+)d?)?$", re.IGNORECASE)
+DATA_ISO = re.compile(r"^\d{4}-\d{2}(-\d{2})?")
+
+ColunaTipada = namedtuple("ColunaTipada", ["tipo", "valores", "validos"])
+
+
+class ParametroInvalido(ValueError):
+    """Parâmetro de consulta inválido (a rota responde 400)."""
+
+
+def _resolver_relativa(texto):
+    """'hoje-30d' -> '2026-09-18' (a data entra já resolvida nas chaves de cache)."""
+    achado = DATA_RELATIVA.match(texto.strip())
+    if not achado:
+        return texto
+    dias = int(achado.group(2) or 0) * (-1 if achado.group(1) == "-" else 1)
+    return (date.today() + timedelta(days=dias)).isoformat()
+
+
+def ler_expressao(texto, colunas):
+    """'cloro_mg_l:0.2..2.0' -> Expressao('cloro_mg_l', 'entre', ('0.2', '2.0'))."""
+    # Casa pelo nome de coluna mais longo: nomes podem conter ':' ou '<'
+    for coluna in sorted((str(c) for c in colunas), key=len, reverse=True):
+        if not texto.startswith(coluna):
+            continue
+        resto = texto[len(coluna):]
+        for simbolo, operador in OPERADORES:
+            if not resto.startswith(simbolo):
+                continue
+            valor = resto[len(simbolo):]
+            if operador == "entre":
+                if ".." not in valor:
+                    raise ParametroInvalido(f"Faixa inválida em '{texto}' (use coluna:min..max).")
+                minimo, maximo = (_resolver_relativa(v.strip()) or None for v in valor.split("..", 1))
+                if minimo is None and maximo is None:
+                    raise ParametroInvalido(f"Faixa vazia em '{texto}'.")
+                return Expressao(coluna, operador, (minimo, maximo))
+            if operador in ("in", "nin"):
+                return Expressao(coluna, operador, valor)
+            if not valor.strip():
+                raise ParametroInvalido(f"Valor ausente em '{texto}'.")
+            return Expressao(coluna, operador, _resolver_relativa(valor.strip()))
+    raise ParametroInvalido(f"Filtro inválido: '{texto}' (coluna desconhecida ou sem operador).")
+
+
+def textos_expressoes(args, colunas):
+    """
+    Expressões do request em texto: as de ?filter= e os parâmetros que não
+    são nomes de coluna mas trazem um operador ('status!'='ok' -> 'status!=ok').
+    """
+    textos = []
+    filtros = args.getlist("filter") if hasattr(args, "getlist") else [args.get("filter")]
+    for filtro in filtros:
+        textos.extend(t.strip() for t in (filtro or "").split(";") if t.strip())
+
+    for chave, valor in args.items():
+        if chave == "filter" or chave in colunas:
+            continue
+        if valor:
+            # O "=" da URL separou o operador do valor: 'data>' + '2026-01-01'
+            if chave.endswith(("!", ">", "<")):
+                textos.append(f"{chave}={valor}")
+            elif chave.endswith((":in", ":nin")):
+                textos.append(f"{chave}:{valor}")
+        elif any(s in chave for s in ("<", ">", ":")):
+            # Sem "=" na URL: 'nota>80', 'cloro:0.2..2.0', 'regional:in:SP|RJ'
+            textos.append(chave)
+    return textos
+
+
+def tipar_coluna(serie):
+    """Coluna como vetor comparável: ('data'|'numero'|'texto', valores, válidos)."""
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype="datetime64[ns]")
+        return ColunaTipada("data", valores, ~np.isnat(valores))
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        return ColunaTipada("numero", valores, ~np.isnan(valores))
+
+    # Texto: converte cada valor distinto uma vez e espalha pelos códigos
+    codigos, unicos = pd.factorize(serie)
+    texto = pd.Series(np.asarray(unicos, dtype=object)).astype(str).str.strip()
+    preenchido = (texto != "") & (texto.str.lower() != "nan")
+    n_preenchidos = int(preenchido.sum())
+
+    def espalhar(por_unico, vazio):
+        # Código -1 (NaN) cai na última posição
+        return np.append(por_unico, vazio).take(codigos)
+
+    if n_preenchidos:
+        numeros = pd.to_numeric(texto.str.replace(",", ".", regex=False).where(preenchido), errors="coerce")
+        if numeros.notna().sum() >= FRACAO_TIPADA * n_preenchidos:
+            valores = espalhar(numeros.to_numpy(dtype=float), np.nan)
+            return ColunaTipada("numero", valores, ~np.isnan(valores))
+
+        with warnings.catch_warnings():
+            # Texto comum não tem formato de data: o aviso do pandas é esperado
+            warnings.simplefilter("ignore", UserWarning)
+            # Uma amostra decide antes (cada texto que não é data custa um dateutil);
+            # sem dígitos ("ok", "Pendente") nem chega a tentar
+            amostra = texto[preenchido].head(AMOSTRA_DATAS)
+            minimo = FRACAO_TIPADA * len(amostra)
+            if (amostra.str.contains(r"\d").sum() >= minimo
+                    and converter_datas(amostra).notna().sum() >= minimo):
+                datas = converter_datas(texto.where(preenchido, ""))
+            else:
+                datas = pd.Series(pd.NaT, index=texto.index)
+        if datas.notna().sum() >= FRACAO_TIPADA * n_preenchidos:
+            valores = espalhar(datas.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT"))
+            return ColunaTipada("data", valores, ~np.isnat(valores))
+
+    dobrados = np.array([dobrar_texto(t) for t in texto], dtype=object)
+    validos = espalhar(preenchido.to_numpy(), False)
+    return ColunaTipada("texto", espalhar(dobrados, ""), validos)
+
+
+def _literal(tipada, texto, expressao):
+    """Valor da expressão no tipo da coluna: (início, fim exclusivo ou None)."""
+    if tipada.tipo == "numero":
+        try:
+            return float(texto.replace(",", ".")), None
+        except ValueError:
+            raise ParametroInvalido(f"'{texto}' não é um número ({expressao.coluna}).")
+    if tipada.tipo == "data":
+        try:
+            valor = pd.Timestamp(texto) if DATA_ISO.match(texto) else pd.to_datetime(texto, dayfirst=True)
+        except (ValueError, TypeError):
+            raise ParametroInvalido(f"'{texto}' não é uma data ({expressao.coluna}).")
+        inicio = valor.to_datetime64()
+        # Data sem hora: o dia inteiro
+        if valor == valor.normalize() and ":" not in texto:
+            return inicio, (valor + pd.Timedelta(days=1)).to_datetime64()
+        return inicio, None
+    return dobrar_texto(texto), None
+
+
+def mascara_comparacao(tipada, expressao):
+    """Vetor booleano (uma posição por linha) de uma expressão gt/ge/lt/le/entre."""
+    valores, validos = tipada.valores, tipada.validos
+
+    def maior(texto, inclusive):
+        inicio, fim = _literal(tipada, texto, expressao)
+        if fim is not None:
+            return valores >= inicio if inclusive else valores >= fim
+        return valores >= inicio if inclusive else valores > inicio
+
+    def menor(texto, inclusive):
+        inicio, fim = _literal(tipada, texto, expressao)
+        if fim is not None:
+            return valores < fim if inclusive else valores < inicio
+        return valores <= inicio if inclusive else valores < inicio
+
+    with np.errstate(invalid="ignore"):
+        if expressao.operador == "gt":
+            resultado = maior(expressao.valor, False)
+        elif expressao.operador == "ge":
+            resultado = maior(expressao.valor, True)
+        elif expressao.operador == "lt":
+            resultado = menor(expressao.valor, False)
+        elif expressao.operador == "le":
+            resultado = menor(expressao.valor, True)
+        else:
+            minimo, maximo = expressao.valor
+            resultado = validos.copy()
+            if minimo is not None:
+                resultado &= maior(minimo, True)
+            if maximo is not None:
+                resultado &= menor(maximo, True)
+    return np.asarray(resultado, dtype=bool) & validos
@@ -0,0 +1,105 @@
+import threading
+import numpy as np
+import pandas as pd
+from mcdagua.core.datas import colunas_publicas
+from mcdagua.services.busca import dobrar_texto
+from mcdagua.services.filters import chave_filtros, combinar_mascaras, mascaras_filtros
+
+# ==============================================================================
+# FACETAS (CONTAGENS DOS FILTROS EM CASCATA, ESTILO EXCEL)
+# ==============================================================================
+# Para cada coluna pedida, devolve os valores e quantas linhas cada um tem
+# considerando todos os OUTROS filtros ativos (o filtro da própria coluna não
+# conta, como no autofiltro do Excel: dá para marcar mais valores nela).
+#
+# Tudo sai dos bitmaps dos filtros (services/filters.py): a seleção de cada
+# coluna é o E dos bitmaps das demais, e a contagem é um np.bincount dos códigos
+# dos valores nas linhas selecionadas. O resultado fica em cache por versão do
+# dataset + conjunto de filtros normalizado.
+
+# Mesmo limite do /api/filtros-opcoes: acima disso a coluna vem sem valores
+LIMITE_VALORES = 1000
+
+# Resultados guardados por versão do dataset
+LIMITE_CACHE = 256
+
+
+class IndiceFacetas:
+    def __init__(self, df):
+        self.df = df
+        self._colunas = {}   # coluna -> (códigos por linha, valores em texto)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def valores(self, coluna):
+        """Códigos (por linha) e valores distintos da coluna, como texto."""
+        if coluna not in self._colunas:
+            with self._lock:
+                if coluna not in self._colunas:
+                    serie = self.df[coluna]
+                    if isinstance(serie.dtype, pd.CategoricalDtype):
+                        codigos = serie.cat.codes.to_numpy()
+                        valores = serie.cat.categories.astype(str).tolist()
+                    else:
+                        codigos, unicos = pd.factorize(serie.astype(str))
+                        valores = list(unicos)
+                    self._colunas[coluna] = (codigos, valores)
+        return self._colunas[coluna]
+
+    def contar(self, coluna, selecao):
+        codigos, valores = self.valores(coluna)
+        if selecao is not None:
+            codigos = codigos[np.unpackbits(selecao, count=len(codigos)).astype(bool)]
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+
+        itens = sorted(
+            (valor, int(n)) for valor, n in zip(valores, contagens)
+            if n > 0 and valor.strip() != ""
+        )
+        if len(itens) > LIMITE_VALORES:
+            return {"valores": [], "truncado": True, "distintos": len(itens)}
+        return {
+            "valores": [{"valor": v, "contagem": n} for v, n in itens],
+            "truncado": False,
+            "distintos": len(itens),
+        }
+
+
+def indice_facetas(dataset):
+    return dataset.memo("indice_facetas", lambda: IndiceFacetas(dataset.df))
+
+
+def _chave_facetas(args, df, colunas):
+    """Busca e filtros normalizados (ordem e maiúsculas não importam) + colunas pedidas."""
+    return (dobrar_texto(args.get("q", "")), chave_filtros(args, df.columns), tuple(colunas))
+
+
+def calcular_facetas(dataset, args, colunas=None):
+    """
+    {"total": linhas com todos os filtros, "facetas": {coluna: {...}}} para as
+    `colunas` pedidas (padrão: todas as públicas).
+    """
+    df = dataset.df
+    colunas = list(colunas) if colunas else colunas_publicas(df)
+    indice = indice_facetas(dataset)
+
+    chave = _chave_facetas(args, df, colunas)
+    em_cache = indice._cache.get(chave)
+    if em_cache is not None:
+        return em_cache
+
+    busca, por_coluna = mascaras_filtros(df, args, dataset)
+
+    todas = combinar_mascaras([busca, *por_coluna.values()])
+    total = len(df) if todas is None else int(np.unpackbits(todas, count=len(df)).sum())
+
+    facetas = {}
+    for coluna in colunas:
+        outras = [m for c, m in por_coluna.items() if c != coluna]
+        facetas[coluna] = indice.contar(coluna, combinar_mascaras([busca, *outras]))
+
+    resultado = {"total": total, "facetas": facetas}
+    if len(indice._cache) >= LIMITE_CACHE:
+        indice._cache.clear()
+    indice._cache[chave] = resultado
+    return resultado
@@ -1,37 +1,249 @@
+import threading
+import numpy as np
 import pandas as pd
+from mcdagua.core.tipos import texto_normalizado
+from mcdagua.services.busca import indice_busca, mascara_busca
+from mcdagua.services.catalogo import catalogo
+from mcdagua.services.expressoes import Expressao, ler_expressao, mascara_comparacao, textos_expressoes, tipar_coluna
 
-def apply_filters(df, args):
-    # Cria uma cópia para não alterar o original
-    out = df.copy()
+# ==============================================================================
+# ÍNDICE DE VALORES POR COLUNA (FILTROS DO ExcelFilter)
+# ==============================================================================
+# Cada filtro de coluna fazia df.copy() + astype(str).str.lower() na coluna
+# inteira. Aqui, uma vez por versão do dataset (e só para as colunas que
+# alguém filtra), cada linha recebe o código do seu valor normalizado; cada
+# valor pedido vira um bitmap de linhas (np.packbits, 1 bit por linha) guardado
+# em cache. "SP|RJ" é o OU dos bitmaps, várias colunas são o E, e a cópia das
+# linhas só acontece uma vez, na seleção final.
+#
+# As expressões de services/expressoes.py (faixas, !=, datas, números) usam o
+# mesmo caminho: cada uma vira um bitmap, guardado no mesmo cache, e todos os
+# filtros de uma coluna são combinados com E.
+#
+# filtrar_linhas aplica primeiro os filtros mais seletivos (estimativa pelo
+# catálogo de colunas) e para assim que a seleção fica vazia, sem montar os
+# bitmaps dos filtros restantes nem rodar a busca livre.
 
-    # Parâmetros de controle (não são colunas)
-    ignore_keys = ["page", "limit", "per_page", "offset", "_", "q"]
+# Bitmaps guardados por índice (acima disso o cache recomeça)
+LIMITE_BITMAPS = 4096
 
-    # 1. Filtro de Busca Geral (Texto livre)
-    q = args.get("q", "").lower()
-    if q:
-        out = out[
-            out.astype(str).apply(lambda x: x.str.lower().str.contains(q, regex=False)).any(axis=1)
-        ]
+# Fração de linhas estimada para comparações e faixas (o catálogo só conhece
+# os valores distintos, não a distribuição)
+SELETIVIDADE_COMPARACAO = 0.5
+SELETIVIDADE_FAIXA = 0.25
+
+# Parâmetros de controle da URL (não são filtros de coluna)
+PARAMETROS_CONTROLE = [
+    "page", "limit", "per_page", "offset", "cursor", "sort", "fields", "exclude",
+    "format", "stream", "filter", "group_by", "metric", "_", "q",
+]
+
+
+class IndiceFiltros:
+    def __init__(self, df):
+        self.df = df
+        self.total = len(df)
+        self._colunas = {}   # coluna -> (códigos por linha, {valor normalizado: código})
+        self._bitmaps = {}   # (coluna, valor) ou Expressao -> bitmap
+        self._tipadas = {}   # coluna -> ColunaTipada (comparações)
+        self._lock = threading.Lock()
+
+    def _coluna(self, coluna):
+        if coluna not in self._colunas:
+            with self._lock:
+                if coluna not in self._colunas:
+                    codigos, valores = pd.factorize(texto_normalizado(self.df[coluna], strip=False))
+                    self._colunas[coluna] = (codigos, {v: i for i, v in enumerate(valores)})
+        return self._colunas[coluna]
+
+    def vazio(self):
+        return np.zeros((self.total + 7) // 8, dtype=np.uint8)
+
+    def bitmap(self, coluna, valor):
+        chave = (coluna, valor)
+        bitmap = self._bitmaps.get(chave)
+        if bitmap is None:
+            codigos, valores = self._coluna(coluna)
+            codigo = valores.get(valor)
+            bitmap = self.vazio() if codigo is None else np.packbits(codigos == codigo)
+            if len(self._bitmaps) >= LIMITE_BITMAPS:
+                self._bitmaps.clear()
+            self._bitmaps[chave] = bitmap
+        return bitmap
+
+    def mascara(self, coluna, valores):
+        """Bitmap das linhas cuja coluna (normalizada) é um dos `valores`."""
+        bitmaps = [self.bitmap(coluna, v) for v in valores]
+        if len(bitmaps) == 1:
+            return bitmaps[0]
+        return np.bitwise_or.reduce(bitmaps)
+
+    def tipada(self, coluna):
+        if coluna not in self._tipadas:
+            with self._lock:
+                if coluna not in self._tipadas:
+                    self._tipadas[coluna] = tipar_coluna(self.df[coluna])
+        return self._tipadas[coluna]
+
+    def expressao(self, expressao):
+        """Bitmap de uma Expressao já normalizada (ver ler_filtros)."""
+        if expressao.operador == "in":
+            return self.mascara(expressao.coluna, expressao.valor)
+        if expressao.operador == "nin":
+            return negar(self.mascara(expressao.coluna, expressao.valor), self.total)
 
-    # 2. Filtros de Coluna
+        bitmap = self._bitmaps.get(expressao)
+        if bitmap is None:
+            bitmap = np.packbits(mascara_comparacao(self.tipada(expressao.coluna), expressao))
+            if len(self._bitmaps) >= LIMITE_BITMAPS:
+                self._bitmaps.clear()
+            self._bitmaps[expressao] = bitmap
+        return bitmap
+
+
+def indice_filtros(dataset):
+    return dataset.memo("indice_filtros", lambda: IndiceFiltros(dataset.df))
+
+
+def _valores_filtro(value):
+    # --- CORREÇÃO DO BUG DA VÍRGULA ---
+    # Agora usamos "|" (pipe) como separador oficial de múltiplos valores.
+    # Isso permite que itens como "Suco, Gelo" sejam tratados como uma única coisa.
+    if "|" in str(value):
+        # Se tiver pipe, é uma lista: "SP|RJ" -> ['sp', 'rj']
+        return [v.strip().lower() for v in str(value).split("|")]
+
+    # Fallback para compatibilidade ou caso único (mesmo que tenha vírgula)
+    # Ex: "torre de suco, back room" (sem pipe) cai aqui e funciona corretamente
+    return [str(value).lower()]
+
+
+def negar(bitmap, total):
+    """NÃO de um bitmap (os bits de sobra do último byte continuam zerados)."""
+    negado = np.invert(bitmap)
+    if total % 8:
+        negado[-1] &= np.uint8(0xFF << (8 - total % 8) & 0xFF)
+    return negado
+
+
+def ler_filtros(args, colunas):
+    """
+    Filtros de coluna do request como Expressoes normalizadas: 'coluna=valor'
+    vira ('coluna', 'in', ('valor',)), listas "|" ficam ordenadas e sem
+    repetição. Filtros por colunas que não existem são ignorados, como sempre
+    foram; expressões com operador e coluna desconhecida são um erro (400).
+    """
+    colunas = list(colunas)
+    expressoes = []
     for key, value in args.items():
-        if key in ignore_keys or not value:
+        if key in PARAMETROS_CONTROLE or not value:
             continue
-        
-        if key in out.columns:
-            # --- CORREÇÃO DO BUG DA VÍRGULA ---
-            # Agora usamos "|" (pipe) como separador oficial de múltiplos valores.
-            # Isso permite que itens como "Suco, Gelo" sejam tratados como uma única coisa.
-            
-            if "|" in str(value):
-                # Se tiver pipe, é uma lista: "SP|RJ" -> ['sp', 'rj']
-                valores_desejados = [v.strip().lower() for v in str(value).split("|")]
-                out = out[out[key].astype(str).str.lower().isin(valores_desejados)]
-            
-            # Fallback para compatibilidade ou caso único (mesmo que tenha vírgula)
-            # Ex: "torre de suco, back room" (sem pipe) cai aqui e funciona corretamente
-            else:
-                out = out[out[key].astype(str).str.lower() == str(value).lower()]
-
-    return out
\ No newline at end of file
+        if key in colunas:
+            expressoes.append(Expressao(key, "in", value))
+
+    controle = [p for p in PARAMETROS_CONTROLE if p != "filter"]
+    for texto in textos_expressoes(args, set(colunas) | set(controle)):
+        expressoes.append(ler_expressao(texto, colunas))
+
+    normalizadas = []
+    for e in expressoes:
+        if e.operador in ("in", "nin"):
+            e = e._replace(valor=tuple(sorted(set(_valores_filtro(e.valor)))))
+        normalizadas.append(e)
+    return normalizadas
+
+
+def chave_filtros(args, colunas):
+    """Forma canônica (hashável, sem ordem) dos filtros de coluna, para caches."""
+    return tuple(sorted(set(ler_filtros(args, colunas)), key=repr))
+
+
+def _bitmap_busca(df, q, dataset=None):
+    linhas = np.zeros(len(df), dtype=bool)
+    if dataset is not None:
+        linhas[indice_busca(dataset).buscar(q)] = True
+    else:
+        linhas = mascara_busca(df, q)
+    return np.packbits(linhas)
+
+
+def _seletividade(cat, expressao):
+    """Fração estimada das linhas que passam na expressão (menor = aplicar antes)."""
+    if expressao.operador in ("in", "nin"):
+        estatistica = cat.coluna(expressao.coluna)
+        if estatistica is None:
+            return 1.0
+        fracao = estatistica.seletividade(expressao.valor)
+        return fracao if expressao.operador == "in" else 1.0 - fracao
+    return SELETIVIDADE_FAIXA if expressao.operador == "entre" else SELETIVIDADE_COMPARACAO
+
+
+def mascaras_filtros(df, args, dataset=None):
+    """
+    Bitmaps (np.packbits) de cada filtro do request: (busca livre ou None,
+    {coluna: bitmap}). Se `dataset` (o Dataset de onde `df` veio) for passado,
+    usa os índices da versão em vez de varrer a tabela.
+    """
+    indexado = dataset is not None and dataset.df is df
+
+    # 1. Filtro de Busca Geral (Texto livre, sem diferenciar acentos)
+    q = args.get("q", "").lower()
+    busca = _bitmap_busca(df, q, dataset if indexado else None) if q else None
+
+    # 2. Filtros de Coluna (igualdade e expressões; vários na mesma coluna = E)
+    indice = indice_filtros(dataset) if indexado else IndiceFiltros(df)
+    colunas = {}
+    for expressao in ler_filtros(args, df.columns):
+        bitmap = indice.expressao(expressao)
+        anterior = colunas.get(expressao.coluna)
+        colunas[expressao.coluna] = bitmap if anterior is None else anterior & bitmap
+
+    return busca, colunas
+
+def combinar_mascaras(mascaras):
+    """E de uma lista de bitmaps (None se a lista for vazia = todas as linhas)."""
+    selecao = None
+    for mascara in mascaras:
+        if mascara is not None:
+            selecao = mascara if selecao is None else selecao & mascara
+    return selecao
+
+
+def filtrar_linhas(df, args, dataset=None):
+    """
+    Posições (ordenadas) das linhas que passam na busca livre e nos filtros de
+    coluna, ou None se nenhum filtro foi pedido.
+    """
+    indexado = dataset is not None and dataset.df is df
+    expressoes = ler_filtros(args, df.columns)
+    q = args.get("q", "").lower()
+    if not expressoes and not q:
+        return None
+
+    if indexado:
+        cat = catalogo(dataset)
+        expressoes.sort(key=lambda e: _seletividade(cat, e))
+        indice = indice_filtros(dataset)
+    else:
+        indice = IndiceFiltros(df)
+
+    selecao = None
+    for expressao in expressoes:
+        bitmap = indice.expressao(expressao)
+        selecao = bitmap if selecao is None else selecao & bitmap
+        if not selecao.any():
+            return np.empty(0, dtype=np.intp)
+
+    if q:
+        busca = _bitmap_busca(df, q, dataset if indexado else None)
+        selecao = busca if selecao is None else selecao & busca
+    return np.flatnonzero(np.unpackbits(selecao, count=len(df)))
+
+
+def apply_filters(df, args, dataset=None):
+    """DataFrame com as linhas que passam nos filtros (ver filtrar_linhas)."""
+    linhas = filtrar_linhas(df, args, dataset)
+    if linhas is None:
+        # Cópia rasa: quem receber pode acrescentar colunas sem mexer no dataset
+        return df.copy(deep=False)
+    return df.iloc[linhas]
@@ -1,19 +1,6 @@
-import pandas as pd
-import numpy as np
-import unicodedata
-
-def normalizar_texto(texto):
-    if not isinstance(texto, str): return str(texto)
-    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8').lower()
-
-def encontrar_coluna(df, termos_busca):
-    colunas_map = {normalizar_texto(c): c for c in df.columns}
-    for termo in termos_busca:
-        termo_norm = normalizar_texto(termo)
-        for col_norm, col_real in colunas_map.items():
-            if termo_norm in col_norm:
-                return col_real
-    return None
+from mcdagua.core.tipos import texto_normalizado
+# normalizar_texto/encontrar_coluna moraram aqui; seguem exportados por este módulo
+from mcdagua.core.datas import com_datas, normalizar_texto, encontrar_coluna
 
 def calculate_kpis(df):
     try:
@@ -35,7 +22,7 @@ def calculate_kpis(df):
         # Calcula Pendências (Top 10)
         if not df_gelo.empty:
             # Value counts
-            top = df_gelo[col_pendencia].value_counts().head(10)
+            top = df_gelo[col_pendencia].astype(object).value_counts().head(10)
             
             # Conversão para tipos nativos do Python (Crucial para JSON)
             labels = [str(x) for x in top.index.tolist()]
@@ -57,6 +44,19 @@ def calculate_kpis(df):
         print(f"⚠️ [KPIs] Erro ao calcular KPIs: {e}")
         return {}
 
+def _linhas_2026(df):
+    """
+    Linhas de 2026 (pela data da coleta) com o mês já resolvido em _mes.
+    None se a planilha não tiver nem coluna de data nem de mês.
+    """
+    df = com_datas(df)
+    if "_data" in df.columns:
+        # SEMPRE filtra ano 2026 pela coluna data
+        df = df[df["_ano"] == 2026]
+    elif not encontrar_coluna(df, ['mes']):
+        return None
+    return df
+
 def get_programado_realizado(df):
     try:
         # Tipos válidos conforme a planilha (exclui "não realizada" e vazias)
@@ -66,41 +66,20 @@ def get_programado_realizado(df):
             "cronograma", 
             "inauguração", "inauguracao"
         ]
-        col_data = encontrar_coluna(df, ['data_coleta', 'data', 'dt_coleta'])
         col_tipo = encontrar_coluna(df, ['tipo_de_coleta', 'tipo', 'servico'])
-        col_mes = encontrar_coluna(df, ['mes'])
         
         if not col_tipo: return {"labels": [], "realizado": [], "programado": []}
 
-        df_work = df.copy()
-        df_work['_tipo_norm'] = df_work[col_tipo].astype(str).str.lower().str.strip()
-        
-        # Determina o mês de cada linha
-        meses_map = {
-            "janeiro": 1, "fevereiro": 2, "março": 3, "marco": 3,
-            "abril": 4, "maio": 5, "junho": 6,
-            "julho": 7, "agosto": 8, "setembro": 9,
-            "outubro": 10, "novembro": 11, "dezembro": 12
-        }
-        
-        # SEMPRE filtra ano 2026 pela coluna data
-        if col_data:
-            df_work[col_data] = pd.to_datetime(df_work[col_data], errors='coerce')
-            df_work = df_work[df_work[col_data].dt.year == 2026]
-        
-        # Usa coluna 'mes' para identificar o mês (mais confiável), senão usa 'data'
-        if col_mes:
-            df_work['_mes_num'] = df_work[col_mes].astype(str).str.lower().str.strip().map(meses_map)
-        elif col_data:
-            df_work['_mes_num'] = df_work[col_data].dt.month
-        else:
+        # _ano/_mes já vêm calculados do loader (core/datas.py)
+        df_work = _linhas_2026(df)
+        if df_work is None:
             return {"labels": [], "realizado": [], "programado": []}
         
         # Filtra apenas tipos válidos
-        df_validos = df_work[df_work['_tipo_norm'].isin(tipos_validos)]
+        validos = texto_normalizado(df_work[col_tipo]).isin(tipos_validos)
         
         # Conta realizados por mês
-        realizado_series = df_validos.groupby('_mes_num').size()
+        realizado_series = df_work.loc[validos, '_mes'].value_counts()
         
         programado_meta = {1: 193, 2: 103, 3: 76, 4: 211, 5: 186, 6: 221}
         
@@ -132,35 +111,15 @@ def get_tipo_coleta_por_mes(df):
     """
     try:
         col_tipo = encontrar_coluna(df, ['tipo_de_coleta', 'tipo', 'servico'])
-        col_mes = encontrar_coluna(df, ['mes'])
-        col_data = encontrar_coluna(df, ['data_coleta', 'data', 'dt_coleta'])
         
         if not col_tipo:
             return {"labels": [], "coleta": [], "recoleta": [], "checklist": []}
 
-        df_work = df.copy()
-        df_work['_tipo_norm'] = df_work[col_tipo].astype(str).str.lower().str.strip()
-        
-        # Mapa de meses
-        meses_map = {
-            "janeiro": 1, "fevereiro": 2, "março": 3, "marco": 3,
-            "abril": 4, "maio": 5, "junho": 6,
-            "julho": 7, "agosto": 8, "setembro": 9,
-            "outubro": 10, "novembro": 11, "dezembro": 12
-        }
-        
-        # SEMPRE filtra ano 2026 pela coluna data
-        if col_data:
-            df_work[col_data] = pd.to_datetime(df_work[col_data], errors='coerce')
-            df_work = df_work[df_work[col_data].dt.year == 2026]
-        
-        # Usa coluna 'mes' para identificar o mês (mais confiável), senão usa 'data'
-        if col_mes:
-            df_work['_mes_num'] = df_work[col_mes].astype(str).str.lower().str.strip().map(meses_map)
-        elif col_data:
-            df_work['_mes_num'] = df_work[col_data].dt.month
-        else:
+        # _ano/_mes já vêm calculados do loader (core/datas.py)
+        df_work = _linhas_2026(df)
+        if df_work is None:
             return {"labels": [], "coleta": [], "recoleta": [], "checklist": []}
+        df_work = df_work.assign(_tipo_norm=texto_normalizado(df_work[col_tipo]))
         
         tipos_coleta = ["cronograma", "coleta", "inauguração", "inauguracao"]
         tipos_recoleta = ["recoleta"]
@@ -174,7 +133,7 @@ def get_tipo_coleta_por_mes(df):
         checklist_vals = []
         
         for m in range(1, 13):
-            df_mes = df_work[df_work['_mes_num'] == m]
+            df_mes = df_work[df_work['_mes'] == m]
             coleta_rows = df_mes[df_mes['_tipo_norm'].isin(tipos_coleta)]
             recoleta_rows = df_mes[df_mes['_tipo_norm'].isin(tipos_recoleta)]
             checklist_rows = df_mes[df_mes['_tipo_norm'].isin(tipos_checklist)]
@@ -231,7 +190,7 @@ def get_nao_conformidade_por_gerente(df):
             return {"labels": [], "valores": []}
 
         df_work = df.copy()
-        df_work['_pend_norm'] = df_work[col_pendencia].astype(str).str.lower().str.strip()
+        df_work['_pend_norm'] = texto_normalizado(df_work[col_pendencia])
         
         # Filtro na coluna de pendências — remove OK e células vazias
         # (exatamente como desmarcar "ok" e "vazia" no filtro do Excel)
@@ -0,0 +1,89 @@
+import threading
+import numpy as np
+import pandas as pd
+from mcdagua.services.busca import dobrar_texto
+
+# ==============================================================================
+# ORDENAÇÃO NO SERVIDOR (?sort=col1,-col2)
+# ==============================================================================
+# Para cada coluna ordenada calculamos uma vez por versão do dataset o "posto"
+# de cada linha (0, 1, 2... na ordem da coluna). Uma ordenação por várias
+# colunas é um np.lexsort desses postos, também guardada em cache; a consulta
+# só precisa passar a máscara dos filtros sobre a permutação pronta.
+#
+# Regras de comparação (parecidas com as do Excel):
+#   - datas e números pela ordem natural; colunas de texto em que todo valor
+#     preenchido é número são comparadas como números;
+#   - demais textos sem diferenciar maiúsculas e acentos;
+#   - células vazias sempre no fim, em ordem crescente ou decrescente;
+#   - empates mantêm a ordem da planilha.
+
+# Ordenações multi-coluna guardadas por índice
+LIMITE_ORDENACOES = 64
+
+
+def _postos(serie):
+    """Posto crescente de cada linha (vazias = maior posto), e o maior posto preenchido."""
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(np.asarray(unicos, dtype=object))
+    texto = unicos.astype(str).str.strip()
+    vazio = (unicos.isna() | (texto == "") | (texto == "NaT")).to_numpy()
+
+    if pd.api.types.is_numeric_dtype(serie.dtype) or pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        chave = unicos[~vazio]
+    else:
+        numeros = pd.to_numeric(texto[~vazio], errors="coerce")
+        if len(numeros) and numeros.notna().all():
+            chave = numeros
+        else:
+            chave = texto[~vazio].map(dobrar_texto)
+
+    posto_unico = np.full(len(unicos) + 1, len(unicos), dtype=np.int32)
+    if len(chave):
+        ordenados = chave.sort_values(kind="stable")
+        valores = ordenados.to_numpy()
+        novos = np.r_[True, valores[1:] != valores[:-1]]
+        posto_unico[ordenados.index.to_numpy()] = np.cumsum(novos) - 1
+        maior = int(novos.sum()) - 1
+    else:
+        maior = -1
+
+    # Código -1 (NaN) cai na última posição de posto_unico (vazia)
+    return posto_unico.take(codigos), maior
+
+
+class IndiceOrdenacao:
+    def __init__(self, df):
+        self.df = df
+        self.total = len(df)
+        self._colunas = {}
+        self._ordens = {}
+        self._lock = threading.Lock()
+
+    def postos(self, coluna, decrescente=False):
+        if coluna not in self._colunas:
+            with self._lock:
+                if coluna not in self._colunas:
+                    self._colunas[coluna] = _postos(self.df[coluna])
+        postos, maior = self._colunas[coluna]
+        if not decrescente:
+            return postos
+        # Inverte só as preenchidas: vazias continuam no fim
+        return np.where(postos <= maior, maior - postos, postos)
+
+    def ordem(self, campos):
+        """Permutação das linhas do dataset para a ordenação pedida."""
+        ordem = self._ordens.get(campos)
+        if ordem is None:
+            chaves = [np.arange(self.total)]
+            for coluna, decrescente in reversed(campos):
+                chaves.append(self.postos(coluna, decrescente))
+            ordem = np.lexsort(chaves)
+            if len(self._ordens) >= LIMITE_ORDENACOES:
+                self._ordens.clear()
+            self._ordens[campos] = ordem
+        return ordem
+
+
+def indice_ordenacao(dataset):
+    return dataset.memo("indice_ordenacao", lambda: IndiceOrdenacao(dataset.df))
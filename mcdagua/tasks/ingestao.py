@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import socket
+import uuid
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# ==============================================================================
+# FILA DE INGESTÃO DE PLANILHAS (UPLOAD EM SEGUNDO PLANO)
+# ==============================================================================
+# O upload só grava o arquivo recebido numa área de preparação e enfileira um
+# job; o processamento pesado (ler, validar, gerar snapshot, publicar e
+# pré-calcular) roda numa thread de fundo do próprio worker. O estado de cada
+# job fica num JSON em '<pasta das planilhas>/ingestao/<id>.json', para que
+# qualquer worker do gunicorn consiga responder /api/ingest-jobs/<id>.
+#
+# A planilha antiga só é substituída (os.replace, atômico) depois que a nova
+# foi lida e validada; se algo falhar antes disso o sistema segue com a versão
+# anterior e o job registra o erro.
+#
+# O JSON do job guarda só um resumo (linhas, colunas, parâmetros do dashboard);
+# jobs terminados há mais de INGEST_JOBS_RETENTION_DAYS dias são apagados
+# sempre que um novo job entra na fila.
+#
+# O job roda no worker que recebeu o upload (pid/host gravados no JSON). Se
+# esse worker morrer no meio (restart, OOM), ninguém mais atualiza o arquivo:
+# ao consultar ou enfileirar, um job na fila/processando cujo processo não
+# existe mais, ou sem progresso há INGEST_JOB_TIMEOUT_MINUTES minutos, é
+# encerrado como erro.
+
+PASTA_INGESTAO = "ingestao"
+
+# Padrão de INGEST_JOBS_RETENTION_DAYS
+RETENCAO_DIAS_PADRAO = 7
+
+# Padrão de INGEST_JOB_TIMEOUT_MINUTES (sem salvar progresso = interrompido)
+TIMEOUT_MINUTOS_PADRAO = 30
+
+# Uma thread por worker: ingestões do mesmo worker rodam em ordem
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestao")
+
+ETAPAS = [
+    ("validando", "Lendo e validando a planilha"),
+    ("snapshot", "Gerando snapshot colunar"),
+    ("backup", "Copiando a versão anterior para backups"),
+    ("publicando", "Publicando a nova versão"),
+    ("precalculando", "Pré-calculando dados do dashboard"),
+]
+
+
+def pasta_jobs(save_path):
+    return os.path.join(os.path.dirname(os.path.abspath(save_path)), PASTA_INGESTAO)
+
+
+class JobIngestao:
+    def __init__(self, pasta, dados):
+        self.pasta = pasta
+        self.dados = dados
+
+    @property
+    def id(self):
+        return self.dados["id"]
+
+    @property
+    def caminho(self):
+        return os.path.join(self.pasta, f"{self.id}.json")
+
+    @property
+    def caminho_preparacao(self):
+        return os.path.join(self.pasta, f"{self.id}.xlsx")
+
+    @classmethod
+    def criar(cls, pasta, tipo, nome_arquivo):
+        os.makedirs(pasta, exist_ok=True)
+        job = cls(pasta, {
+            "id": uuid.uuid4().hex,
+            "tipo": tipo,
+            "arquivo": nome_arquivo,
+            "status": "na_fila",
+            "etapa": None,
+            "progresso": 0,
+            "etapas": [],
+            "erro": None,
+            "aviso": None,
+            "versao": None,
+            "resultado": None,
+            "criado_em": datetime.now().isoformat(timespec="seconds"),
+            "concluido_em": None,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+        })
+        job.salvar()
+        return job
+
+    @classmethod
+    def carregar(cls, pasta, job_id):
+        # O id vira nome de arquivo: só aceitamos o formato gerado (uuid hex)
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        caminho = os.path.join(pasta, f"{job_id}.json")
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, "r", encoding="utf-8") as f:
+            return cls(pasta, json.load(f))
+
+    def salvar(self):
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.dados, f, ensure_ascii=False, default=str)
+        os.replace(temporario, self.caminho)
+
+    def iniciar_etapa(self, nome):
+        indice = [e[0] for e in ETAPAS].index(nome)
+        self.dados["status"] = "processando"
+        self.dados["etapa"] = nome
+        self.dados["progresso"] = int(indice * 100 / len(ETAPAS))
+        self.dados["etapas"].append({
+            "nome": nome,
+            "descricao": dict(ETAPAS)[nome],
+            "inicio": datetime.now().isoformat(timespec="seconds"),
+            "duracao_ms": None,
+        })
+        self.salvar()
+        return time.perf_counter()
+
+    def concluir_etapa(self, inicio):
+        self.dados["etapas"][-1]["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        self.salvar()
+
+    def motivo_interrupcao(self, timeout_minutos):
+        """Por que um job ainda em andamento não vai mais terminar (None se ele segue vivo)."""
+        if self.dados.get("status") not in ("na_fila", "processando"):
+            return None
+        pid = self.dados.get("pid")
+        if pid and self.dados.get("host") == socket.gethostname() and not _processo_existe(pid):
+            return "Processamento interrompido: o worker que executava o job foi encerrado."
+        try:
+            parado = time.time() - os.path.getmtime(self.caminho)
+        except OSError:
+            return None
+        if parado > timeout_minutos * 60:
+            return f"Processamento interrompido: sem progresso há mais de {timeout_minutos} minutos."
+        return None
+
+    def encerrar_se_interrompido(self, timeout_minutos):
+        motivo = self.motivo_interrupcao(timeout_minutos)
+        if motivo is None:
+            return False
+        self.finalizar("erro", motivo)
+        print(f"⚠️ [INGESTÃO] Job {self.id} encerrado: {motivo}")
+        return True
+
+    def finalizar(self, status, erro=None):
+        self.dados["status"] = status
+        self.dados["erro"] = erro
+        if status == "concluido":
+            self.dados["progresso"] = 100
+        self.dados["concluido_em"] = datetime.now().isoformat(timespec="seconds")
+        self.salvar()
+
+
+def _processo_existe(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # existe, mas é de outro usuário (ou Windows sem suporte)
+        return True
+    return True
+
+
+def limpar_jobs_antigos(pasta, dias, timeout_minutos=TIMEOUT_MINUTOS_PADRAO):
+    """
+    Apaga jobs terminados (concluído/erro) sem alteração há mais de `dias`
+    dias e encerra como erro os que ficaram órfãos em andamento.
+    """
+    if not os.path.isdir(pasta):
+        return 0
+    limite = time.time() - dias * 86400
+    removidos = 0
+    for nome in os.listdir(pasta):
+        if not nome.endswith(".json"):
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            job = JobIngestao.carregar(pasta, nome[:-len(".json")])
+            if job is None or job.encerrar_se_interrompido(timeout_minutos):
+                continue
+            if job.dados.get("status") not in ("concluido", "erro") or os.path.getmtime(caminho) >= limite:
+                continue
+            os.remove(caminho)
+            if os.path.exists(job.caminho_preparacao):
+                os.remove(job.caminho_preparacao)
+            removidos += 1
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [INGESTÃO] Não foi possível remover o job {nome}: {e}")
+    return removidos
+
+
+def enfileirar_ingestao(app, tipo, arquivo, save_path):
+    """
+    Grava o upload na área de preparação e agenda o processamento.
+    Retorna o JobIngestao já persistido (status 'na_fila').
+    """
+    pasta = pasta_jobs(save_path)
+    removidos = limpar_jobs_antigos(
+        pasta,
+        app.config.get("INGEST_JOBS_RETENTION_DAYS", RETENCAO_DIAS_PADRAO),
+        app.config.get("INGEST_JOB_TIMEOUT_MINUTES", TIMEOUT_MINUTOS_PADRAO),
+    )
+    if removidos:
+        print(f"🧹 [INGESTÃO] {removidos} job(s) antigo(s) removido(s).")
+
+    job = JobIngestao.criar(pasta, tipo, arquivo.filename)
+    arquivo.save(job.caminho_preparacao)
+    _executor.submit(_executar_job, app, job, save_path)
+    print(f"📨 [INGESTÃO] Job {job.id} ({tipo}) enfileirado.")
+    return job
+
+
+def obter_job(save_path, job_id, timeout_minutos=TIMEOUT_MINUTOS_PADRAO):
+    job = JobIngestao.carregar(pasta_jobs(save_path), job_id)
+    if job is None:
+        return None
+    job.encerrar_se_interrompido(timeout_minutos)
+    return job.dados
+
+
+def _executar_job(app, job, save_path):
+    # Imports aqui para evitar ciclo (rotas -> tasks -> loader -> rotas)
+    from mcdagua.core.datas import colunas_publicas
+    from mcdagua.core.loader import get_dataset, refresh_dataframe
+    from mcdagua.core.payloads import materializar_payload
+    from mcdagua.core.registry import datasets
+    from mcdagua.core.snapshot import fingerprint_arquivo, salvar_snapshot
+    from mcdagua.core.workbook import abrir_sessao
+    from mcdagua.routes.upload import realizar_backup
+    from mcdagua.services.catalogo import catalogo
+    from mcdagua.services.dashboards import montar_graficos_data, montar_haccp_graficos
+    from mcdagua.services.excel_processor import processar_aba_geral
+
+    tipo = job.dados["tipo"]
+    preparado = job.caminho_preparacao
+
+    with app.app_context():
+        try:
+            # 1. Lê com o mesmo leitor dos loaders: planilha ilegível não é publicada
+            inicio = job.iniciar_etapa("validando")
+            df = datasets.leitor(tipo)(preparado)
+            if df.empty:
+                raise ValueError("A planilha não pôde ser lida ou não contém dados na aba esperada.")
+            job.dados["resultado"] = {"linhas": len(df), "colunas": len(colunas_publicas(df))}
+            job.concluir_etapa(inicio)
+
+            # 2. Snapshot já com o nome final: depois do os.replace o conteúdo é o
+            #    mesmo, então o registro carrega direto do parquet
+            inicio = job.iniciar_etapa("snapshot")
+            salvar_snapshot(save_path, tipo, df, fingerprint_arquivo(preparado))
+            job.concluir_etapa(inicio)
+
+            inicio = job.iniciar_etapa("backup")
+            realizar_backup(save_path)
+            job.concluir_etapa(inicio)
+
+            # 3. Troca atômica: leitores veem a versão antiga ou a nova, nunca meia
+            inicio = job.iniciar_etapa("publicando")
+            os.replace(preparado, save_path)
+            refresh_dataframe()
+            dataset = get_dataset(tipo)
+            job.dados["versao"] = dataset.versao
+            job.concluir_etapa(inicio)
+
+            inicio = job.iniciar_etapa("precalculando")
+            if tipo == "geral":
+                dados_dashboard, erro = processar_aba_geral(abrir_sessao(save_path))
+                if erro:
+                    print(f"⚠️ [PROCESSAMENTO] Aviso: {erro}")
+                    job.dados["aviso"] = f"Arquivo salvo, mas houve erro ao gerar gráficos: {erro}"
+                else:
+                    # Só o resumo: o JSON do job não é cache do dashboard
+                    detalhes = dados_dashboard.get("detalhes_parametros") or {}
+                    job.dados["resultado"]["parametros_dashboard"] = len(detalhes)
+            # JSON dos dashboards pronto antes do primeiro acesso à nova versão
+            try:
+                if tipo == "geral":
+                    materializar_payload("graficos-data", save_path, montar_graficos_data)
+                elif tipo == "haccp":
+                    materializar_payload("haccp-graficos", save_path, montar_haccp_graficos)
+            except Exception as e:
+                print(f"⚠️ [PAYLOADS] Não foi possível pré-calcular: {e}")
+            # Catálogo de colunas (opções de filtro, estatísticas) desta versão
+            try:
+                catalogo(dataset).montar()
+            except Exception as e:
+                print(f"⚠️ [CATÁLOGO] Não foi possível pré-calcular: {e}")
+            job.concluir_etapa(inicio)
+
+            job.finalizar("concluido")
+            print(f"✅ [INGESTÃO] Job {job.id} concluído: {tipo} versão {dataset.versao}.")
+
+        except Exception as e:
+            traceback.print_exc()
+            job.finalizar("erro", str(e))
+            print(f"❌ [INGESTÃO] Job {job.id} falhou: {e}")
+        finally:
+            if os.path.exists(preparado):
+                try:
+                    os.remove(preparado)
+                except OSError:
+                    pass